@@ -0,0 +1,58 @@
+"""
+Latency benchmark: sklearn RandomForestClassifier.predict_proba vs lib.forest.CompiledForest.
+
+Usage:
+    python benchmarks/bench_forest.py [--repeat N]
+
+Uses the Random Forest from the model registry (training it if missing)
+and checks that both engines return identical probabilities.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add repo root to sys.path
+_repo_root = Path(__file__).resolve().parent.parent
+if str(_repo_root) not in sys.path:
+    sys.path.insert(0, str(_repo_root))
+
+import numpy as np
+from lib import ml
+from lib.forest import CompiledForest
+
+BATCH_SIZES = [1, 10, 100, 1000, 10000]
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per batch size (best is reported)")
+    args = parser.parse_args()
+
+    ml._ensure_models()
+    rf = ml._models["rf"]["model"]
+    compiled = CompiledForest.from_sklearn(rf)
+    rng = np.random.RandomState(0)
+
+    print(f"trees={len(rf.estimators_)} max_depth={compiled.max_depth} nodes={len(compiled.feature)}")
+    print(f"{'batch':>7} {'sklearn ms':>12} {'numpy ms':>10} {'speedup':>8}  identical")
+    for n in BATCH_SIZES:
+        X = ml._scaler.transform(rng.normal(size=(n, len(ml._feature_names))) * 10 + 50)
+        identical = np.array_equal(rf.predict_proba(X), compiled.predict_proba(X))
+        repeat = max(3, args.repeat if n <= 1000 else args.repeat // 4)
+        t_sklearn = _best_of(lambda: rf.predict_proba(X), repeat)
+        t_numpy = _best_of(lambda: compiled.predict_proba(X), repeat)
+        print(f"{n:>7} {t_sklearn * 1000:>12.3f} {t_numpy * 1000:>10.3f} {t_sklearn / t_numpy:>7.1f}x  {identical}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Render benchmark for lib.pdf.build_report: time and allocations per report.
+
+Usage:
+    python benchmarks/bench_pdf.py [--reports N]
+
+Renders N synthetic analyses (cycling through every diagnosis, severity
+and best model) and reports the first render, the steady-state time per
+report, and the tracemalloc peak of a single render.
+"""
+import argparse
+import statistics
+import sys
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+
+# Add repo root to sys.path
+_repo_root = Path(__file__).resolve().parent.parent
+if str(_repo_root) not in sys.path:
+    sys.path.insert(0, str(_repo_root))
+
+from lib.pdf import build_report
+
+DIAGNOSES = {
+    0: "Normal Sleep Pattern",
+    1: "Moderate Sleep Issues - Review Recommended",
+    2: "High Risk Sleep Disorder Detected",
+}
+MODELS = ["Random Forest", "Support Vector Machine", "K-Nearest Neighbors"]
+
+
+def sample_row(i: int) -> dict:
+    severity = i % 3
+    return {
+        "id": f"bench-{i:06d}",
+        "user_email": f"patient{i}@example.com",
+        "phone": f"+1555{i:07d}",
+        "age": 20 + i % 60,
+        "gender": "Female" if i % 2 else "Male",
+        "occupation": "Nurse",
+        "bmi_category": "Normal",
+        "blood_pressure": 110 + i % 60,
+        "heart_rate": 60 + i % 50,
+        "sleep_duration": 4 + (i % 50) / 10,
+        "stress": i % 11,
+        "snoring_frequency": i % 8,
+        "working_hours": 6 + i % 7,
+        "diagnosis": DIAGNOSES[severity],
+        "severity": severity,
+        "ml_model_used": MODELS[i % len(MODELS)],
+        "ml_confidence": 70 + i % 30,
+        "ml_model_accuracy": 90.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--reports", type=int, default=300, help="reports rendered for the timing")
+    args = parser.parse_args()
+    warnings.simplefilter("ignore", DeprecationWarning)
+
+    rows = [sample_row(i) for i in range(args.reports)]
+
+    start = time.perf_counter()
+    size = len(build_report(rows[0]))
+    first_ms = (time.perf_counter() - start) * 1000
+
+    # Warm every layout variant once, then time steady state
+    for row in rows[:len(DIAGNOSES) * len(MODELS)]:
+        build_report(row)
+    times = []
+    for row in rows:
+        start = time.perf_counter()
+        build_report(row)
+        times.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    build_report(rows[1])
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"reports:              {args.reports}")
+    print(f"PDF size:             {size / 1024:.1f} KB")
+    print(f"first render:         {first_ms:.2f} ms")
+    print(f"per report (median):  {statistics.median(times):.2f} ms")
+    print(f"per report (p95):     {sorted(times)[int(len(times) * 0.95) - 1]:.2f} ms")
+    print(f"throughput:           {1000 / statistics.mean(times):.0f} reports/s")
+    print(f"tracemalloc peak:     {peak / 1024:.0f} KB per render ({retained / 1024:.0f} KB retained)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Cold-start benchmark: import time and RSS of each page script's imports.
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat N]
+
+Each page's top-level imports are executed in a fresh interpreter, after
+importing streamlit (shared by every page and reported separately). The
+report lists the extra time and RSS the page's own imports cost, and
+which heavy optional packages they pulled in.
+"""
+import argparse
+import ast
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+# Add repo root to sys.path
+_repo_root = Path(__file__).resolve().parent.parent
+if str(_repo_root) not in sys.path:
+    sys.path.insert(0, str(_repo_root))
+
+HEAVY_MODULES = ["sklearn", "joblib", "supabase", "fpdf", "pandas"]
+
+_PROBE = r'''
+import json, sys, time
+sys.path.insert(0, {root!r})
+
+def rss_kb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+start = time.perf_counter()
+import streamlit
+base_time = time.perf_counter() - start
+base_rss = rss_kb()
+start = time.perf_counter()
+exec(compile({imports!r}, "imports", "exec"), {{}})
+page_time = time.perf_counter() - start
+print(json.dumps({{
+    "streamlit_ms": base_time * 1000,
+    "page_ms": page_time * 1000,
+    "page_rss_mb": (rss_kb() - base_rss) / 1024,
+    "rss_mb": rss_kb() / 1024,
+    "heavy": [m for m in {heavy!r} if m in sys.modules],
+}}))
+'''
+
+
+def page_imports(path: Path) -> str:
+    """Source of the module-level import statements of a page script."""
+    tree = ast.parse(path.read_text(encoding="utf-8"))
+    nodes = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return "\n".join(ast.get_source_segment(path.read_text(encoding="utf-8"), node) for node in nodes)
+
+
+def measure(path: Path) -> dict:
+    code = _PROBE.format(root=str(_repo_root), imports=page_imports(path), heavy=HEAVY_MODULES)
+    out = subprocess.run([sys.executable, "-c", code], cwd=_repo_root, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per page (best time is reported)")
+    args = parser.parse_args()
+
+    pages = [_repo_root / "streamlit_app.py"] + sorted((_repo_root / "pages").glob("*.py"))
+    pages = [p for p in pages if p.name != "__init__.py"]
+
+    print(f"{'page':<32} {'streamlit ms':>12} {'page ms':>8} {'page MB':>8} {'RSS MB':>7}  heavy imports")
+    for path in pages:
+        runs = [measure(path) for _ in range(args.repeat)]
+        best = min(runs, key=lambda r: r["page_ms"])
+        heavy = ", ".join(best["heavy"]) or "-"
+        print(f"{path.stem:<32} {best['streamlit_ms']:>12.0f} {best['page_ms']:>8.0f} "
+              f"{best['page_rss_mb']:>8.1f} {best['rss_mb']:>7.1f}  {heavy}")
+
+
+if __name__ == "__main__":
+    main()
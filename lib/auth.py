@@ -5,6 +5,8 @@ from pathlib import Path
 
 from passlib.hash import pbkdf2_sha256
 
+from lib.db import LOCAL_BACKEND, get_local_user, add_local_user, list_local_users, clear_local_users
+
 
 # Local file storage for users (development mode)
 USERS_FILE = Path(__file__).parent.parent / ".data" / "users.json"
@@ -35,6 +37,10 @@ def _save(data: Dict[str, Dict[str, str]]):
 def register(email: str, password: str) -> bool:
     """Register a new user with email and hashed password."""
     email = email.strip().lower()
+    if LOCAL_BACKEND == "sqlite":
+        if get_local_user(email):
+            return False
+        return add_local_user(email, pbkdf2_sha256.hash(password))
     data = _load()
     if email in data["users"]:
         return False
@@ -47,8 +53,7 @@ def register(email: str, password: str) -> bool:
 def verify(email: str, password: str) -> bool:
     """Verify user credentials."""
     email = email.strip().lower()
-    data = _load()
-    hashed = data["users"].get(email)
+    hashed = get_user(email)
     if not hashed:
         return False
     return pbkdf2_sha256.verify(password, hashed)
@@ -57,5 +62,22 @@ def verify(email: str, password: str) -> bool:
 def get_user(email: str) -> Optional[str]:
     """Get user by email."""
     email = email.strip().lower()
+    if LOCAL_BACKEND == "sqlite":
+        return get_local_user(email)
     data = _load()
     return data["users"].get(email)
+
+
+def list_users() -> Dict[str, str]:
+    """List all users as {email: password_hash}."""
+    if LOCAL_BACKEND == "sqlite":
+        return list_local_users()
+    return _load()["users"]
+
+
+def clear_users():
+    """Delete all registered users."""
+    if LOCAL_BACKEND == "sqlite":
+        clear_local_users()
+    elif USERS_FILE.exists():
+        USERS_FILE.unlink()
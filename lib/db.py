@@ -1,7 +1,20 @@
 import os
+import atexit
 import json
 import uuid
-from typing import Any, Dict, List, Optional
+import sqlite3
+import base64
+import gzip
+import importlib.util
+import re
+import signal
+import sys
+import threading
+import time
+import zlib
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
 from datetime import datetime
 
@@ -10,43 +23,800 @@ try:
 except Exception:
     st = None
 
-try:
-    from supabase import create_client, Client
-    SUPABASE_AVAILABLE = True
-except ImportError:
-    SUPABASE_AVAILABLE = False
-    Client = None
+# supabase is only imported by get_client() once URL and key are configured,
+# so pages that never talk to Supabase (login, register) do not load it
+SUPABASE_AVAILABLE = importlib.util.find_spec("supabase") is not None
+if TYPE_CHECKING:
+    from supabase import Client
+
+_client: Optional["Client"] = None
+
+
+def _get_setting(name: str, default: Optional[str] = None) -> Optional[str]:
+    """Read a setting from Streamlit secrets, then the environment."""
+    value = None
+    if st is not None:
+        try:
+            value = st.secrets.get(name)
+        except Exception:
+            pass
+    return value or os.environ.get(name, default)
 
-_client: Optional[Client] = None
 
 # Local file storage for analyses (fallback when Supabase unavailable)
 DATA_DIR = Path(__file__).parent.parent / ".data"
-ANALYSES_FILE = DATA_DIR / "analyses.json"
+ANALYSES_FILE = DATA_DIR / "analyses.json"  # legacy single-document format
+ANALYSES_LOG = DATA_DIR / "analyses.jsonl"  # legacy single append-only log
+# Monthly append-only segments: YYYY-MM.jsonl, gzipped to YYYY-MM.jsonl.gz once closed
+SEGMENTS_DIR = DATA_DIR / "analyses"
+USERS_FILE = DATA_DIR / "users.json"
+SQLITE_FILE = DATA_DIR / "sleep.db"
+
+# Durable spool of rows waiting to be written to Supabase (write-behind)
+OUTBOX_FILE = DATA_DIR / "outbox.jsonl"
+OUTBOX_INFLIGHT_FILE = DATA_DIR / "outbox.inflight.jsonl"
+# Rows Supabase rejected outright (bad value, constraint), kept with the error. They
+# are still served by reads like spooled rows; `requeue-rejected` retries them.
+OUTBOX_REJECTED_FILE = DATA_DIR / "outbox.rejected.jsonl"
+
+# Running aggregate counters, updated on every save
+STATS_FILE = DATA_DIR / "stats.json"
+
+# Local backend: "jsonl" (monthly append-only segments) or "sqlite" (indexed, WAL mode)
+LOCAL_BACKEND = str(_get_setting("LOCAL_STORAGE_BACKEND", "jsonl")).lower()
+
+# Segment policy, in days after the end of a segment's month:
+# compress closed segments after N days; delete them after N days (0 = keep forever)
+SEGMENT_COMPRESS_AFTER_DAYS = int(_get_setting("SEGMENT_COMPRESS_AFTER_DAYS", "0"))
+SEGMENT_RETENTION_DAYS = int(_get_setting("SEGMENT_RETENTION_DAYS", "0"))
+# Parsed segments kept in memory at once
+SEGMENT_CACHE_SIZE = int(_get_setting("SEGMENT_CACHE_SIZE", "12"))
+
+
+_SEGMENT_RE = re.compile(r"^(\d{4}-\d{2})\.jsonl(\.gz)?$")
+_UNDATED_SEGMENT = "0000-00"
+# Marker record left in a segment when its row was re-saved into another month
+_TOMBSTONE = "_superseded"
+_segments_ready = False
+
+
+def _segment_month(row: Dict[str, Any]) -> str:
+    created_at = str(row.get("created_at") or "")
+    return created_at[:7] if re.match(r"^\d{4}-\d{2}", created_at) else _UNDATED_SEGMENT
+
+
+def _segment_path(month: str) -> Path:
+    """Existing file for a month (compressed or not), else the new hot file."""
+    compressed = SEGMENTS_DIR / f"{month}.jsonl.gz"
+    return compressed if compressed.exists() else SEGMENTS_DIR / f"{month}.jsonl"
+
+
+def _segments() -> List[Tuple[str, Path]]:
+    """All (month, path) segments, newest month first."""
+    found = {}
+    for path in SEGMENTS_DIR.iterdir():
+        match = _SEGMENT_RE.match(path.name)
+        if match:
+            # A compressed file wins over a leftover plain one of the same month
+            if match.group(1) not in found or match.group(2):
+                found[match.group(1)] = path
+    return sorted(found.items(), reverse=True)
+
+
+def _migrate_legacy_files():
+    """One-shot migration of analyses.json / analyses.jsonl into monthly segments."""
+    for legacy in (ANALYSES_FILE, ANALYSES_LOG):
+        if not legacy.exists():
+            continue
+        if legacy == ANALYSES_FILE:
+            with open(legacy, "r") as f:
+                analyses = json.load(f).get("analyses", [])
+        else:
+            analyses = _read_log(legacy)
+        by_month: Dict[str, List[Dict[str, Any]]] = {}
+        for analysis in analyses:
+            by_month.setdefault(_segment_month(analysis), []).append(analysis)
+        for month, rows in by_month.items():
+            _append_jsonl(_segment_path(month), rows)
+        legacy.rename(legacy.with_name(legacy.name + ".migrated"))
 
 
 def _ensure_local_storage():
-    """Ensure local data directory and files exist."""
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    if not ANALYSES_FILE.exists():
-        with open(ANALYSES_FILE, "w") as f:
-            json.dump({"analyses": []}, f)
+    """Ensure the segment directory exists and legacy files are migrated."""
+    global _segments_ready
+    if _segments_ready and SEGMENTS_DIR.exists():
+        return
+    with _cache_lock:
+        SEGMENTS_DIR.mkdir(parents=True, exist_ok=True)
+        _migrate_legacy_files()
+        apply_segment_policy()
+        _segments_ready = True
+
+
+def _gzip_members(data: bytes) -> Iterator[bytes]:
+    """Decompress a chain of gzip members one at a time, skipping corrupt ones.
+    
+    Every append to a compressed segment adds a member, so a torn or
+    damaged member must not hide the complete ones written after it.
+    """
+    view = memoryview(data)
+    pos = 0
+    while pos < len(data):
+        member = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            out = member.decompress(view[pos:])
+        except zlib.error:
+            # Resume at the next member header
+            pos = data.find(b"\x1f\x8b\x08", pos + 1)
+            if pos < 0:
+                return
+            continue
+        yield out
+        if not member.eof:
+            # Truncated trailing member; keep what was readable
+            return
+        pos = len(data) - len(member.unused_data)
+
+
+def _read_log(path: Path) -> List[Dict[str, Any]]:
+    """Parse a JSONL log (plain or gzipped), skipping blank lines and torn writes."""
+    if path.suffix == ".gz":
+        with open(path, "rb") as f:
+            lines = b"\n".join(_gzip_members(f.read())).decode("utf-8", errors="replace").splitlines()
+    else:
+        with open(path, "r") as f:
+            lines = f.readlines()
+    analyses = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            analyses.append(json.loads(line))
+        except ValueError:
+            # Torn write from a crash mid-append; skip it
+            continue
+    return _drop_superseded(analyses)
+
+
+def _drop_superseded(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Drop tombstones and the copies they cover.
+    
+    A row re-saved into another month leaves a tombstone in its old
+    segment; copies of that id written before the tombstone are gone.
+    """
+    if not any(_TOMBSTONE in row for row in rows):
+        return rows
+    superseded = set()
+    kept = []
+    for row in reversed(rows):
+        if _TOMBSTONE in row:
+            superseded.add(row.get("id"))
+        elif row.get("id") not in superseded:
+            kept.append(row)
+    kept.reverse()
+    return kept
+
+
+def _latest_by_id(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One row per id: the last copy wins, at the position of the first."""
+    latest: Dict[Any, Dict[str, Any]] = {}
+    for i, row in enumerate(rows):
+        row_id = row.get("id")
+        latest[row_id if row_id is not None else ("no-id", i)] = row
+    return list(latest.values())
 
 
 def _load_local_analyses() -> List[Dict[str, Any]]:
-    """Load analyses from local JSON file."""
+    """Load all analyses from the local segments, oldest month first."""
     _ensure_local_storage()
-    with open(ANALYSES_FILE, "r") as f:
-        return json.load(f).get("analyses", [])
+    analyses = []
+    for _, path in reversed(_segments()):
+        analyses.extend(_read_log(path))
+    return _latest_by_id(analyses)
+
+
+def _sort_key(row: Dict[str, Any]) -> tuple:
+    return (str(row.get("created_at") or ""), str(row.get("id") or ""))
+
 
+class _SortedRows:
+    """Rows kept in ascending (created_at, id) order for newest-first reads."""
 
-def _save_local_analyses(analyses: List[Dict[str, Any]]):
-    """Save analyses to local JSON file."""
+    def __init__(self):
+        self.keys: List[tuple] = []
+        self.rows: List[Dict[str, Any]] = []
+
+    def add(self, row: Dict[str, Any]):
+        key = _sort_key(row)
+        if not self.keys or key >= self.keys[-1]:
+            # Common case: new rows are the newest
+            self.keys.append(key)
+            self.rows.append(row)
+            return
+        i = bisect_right(self.keys, key)
+        self.keys.insert(i, key)
+        self.rows.insert(i, row)
+
+    def remove(self, row: Dict[str, Any]):
+        i = bisect_left(self.keys, _sort_key(row))
+        while i < len(self.rows) and self.keys[i] == _sort_key(row):
+            if self.rows[i] is row:
+                del self.keys[i]
+                del self.rows[i]
+                return
+            i += 1
+
+    def newest(self, limit: int, before: Optional[tuple] = None) -> List[Dict[str, Any]]:
+        """Up to `limit` rows newest-first, strictly older than the `before` key."""
+        end = len(self.rows) if before is None else bisect_left(self.keys, before)
+        if limit <= 0 or end == 0:
+            return []
+        return self.rows[max(0, end - limit):end][::-1]
+
+
+class _LogCache:
+    """One parsed segment with hash indexes by id and user_email.
+    
+    A row saved again under the same id is appended to the segment its
+    created_at picks; the latest copy is the one indexed and listed, and a
+    tombstone drops the copy that moved to another month. Validated against the file's (mtime, size) so writes from other
+    processes are picked up; our own appends update it in place.
+    """
+
+    def __init__(self, signature: Optional[tuple], records: List[Dict[str, Any]]):
+        self.signature = signature
+        self.records: List[Dict[str, Any]] = []
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.by_user: Dict[str, _SortedRows] = {}
+        self.ordered = _SortedRows()
+        for record in records:
+            self.add(record)
+
+    def add(self, record: Dict[str, Any]):
+        record_id = record.get("id")
+        if record_id is not None:
+            # A re-saved id is appended again; the later copy replaces the earlier one
+            previous = self.by_id.pop(record_id, None)
+            if previous is not None:
+                self.ordered.remove(previous)
+                self.by_user[previous.get("user_email")].remove(previous)
+        if _TOMBSTONE in record:
+            return
+        if record_id is not None:
+            self.by_id[record_id] = record
+        self.records.append(record)
+        self.by_user.setdefault(record.get("user_email"), _SortedRows()).add(record)
+        self.ordered.add(record)
+
+
+_cache_lock = threading.RLock()
+_segment_cache: "OrderedDict[Path, _LogCache]" = OrderedDict()
+
+
+def _file_signature(path: Path) -> Optional[tuple]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _cached_segment(path: Path) -> _LogCache:
+    """Return the cache for one segment, re-parsing only if the file changed."""
+    with _cache_lock:
+        signature = _file_signature(path)
+        cache = _segment_cache.get(path)
+        if cache is None or cache.signature != signature:
+            cache = _LogCache(signature, _read_log(path) if signature else [])
+            _segment_cache[path] = cache
+        _segment_cache.move_to_end(path)
+        while len(_segment_cache) > max(1, SEGMENT_CACHE_SIZE):
+            _segment_cache.popitem(last=False)
+        return cache
+
+
+class _IdIndex:
+    """Which month's segment holds the current copy of each analysis id.
+    
+    Built with one pass over the segments the first time a lookup needs
+    it, then kept current: our own appends update it in place, and a
+    segment another process wrote (or that was compressed or deleted) is
+    re-read on the next refresh(), which otherwise costs one stat per
+    segment. Reads go straight to the files, not through the segment
+    cache, so building it does not evict the hot months.
+    """
+
+    def __init__(self):
+        self.built = False
+        self.months: Dict[str, str] = {}
+        self.ids_by_month: Dict[str, set] = {}
+        self.signatures: Dict[str, Optional[tuple]] = {}
+
+    def refresh(self):
+        current = dict(_segments())
+        for month in [m for m in self.signatures if m not in current]:
+            self._drop(month)
+        # Oldest first, so an id left in two months by older versions resolves to the newer one
+        for month, path in sorted(current.items()):
+            signature = _file_signature(path)
+            if self.signatures.get(month) != signature:
+                self._drop(month)
+                ids = {row["id"] for row in _read_log(path) if row.get("id") is not None}
+                for analysis_id in ids:
+                    self.months[analysis_id] = month
+                self.ids_by_month[month] = ids
+                self.signatures[month] = signature
+        self.built = True
+
+    def _drop(self, month: str):
+        for analysis_id in self.ids_by_month.pop(month, ()):
+            if self.months.get(analysis_id) == month:
+                del self.months[analysis_id]
+        self.signatures.pop(month, None)
+
+    def note_append(self, month: str, rows: List[Dict[str, Any]], before: Optional[tuple], after: Optional[tuple]):
+        """Record rows (and tombstones) we just appended to a month's segment."""
+        if not self.built:
+            return
+        ids = self.ids_by_month.setdefault(month, set())
+        for row in rows:
+            analysis_id = row.get("id")
+            if analysis_id is None:
+                continue
+            if _TOMBSTONE in row:
+                ids.discard(analysis_id)
+                if self.months.get(analysis_id) == month:
+                    del self.months[analysis_id]
+            else:
+                ids.add(analysis_id)
+                self.months[analysis_id] = month
+        if self.signatures.get(month) == before:
+            self.signatures[month] = after
+
+
+_id_index = _IdIndex()
+
+
+def _index_months(ids: List[str]) -> Dict[str, List[str]]:
+    """Group ids by the month whose segment holds them; unknown ids are left out."""
+    with _cache_lock:
+        _id_index.refresh()
+        by_month: Dict[str, List[str]] = {}
+        for analysis_id in ids:
+            month = _id_index.months.get(analysis_id)
+            if month is not None:
+                by_month.setdefault(month, []).append(analysis_id)
+        return by_month
+
+
+def _invalidate_cache():
+    global _id_index
+    with _cache_lock:
+        _segment_cache.clear()
+        _id_index = _IdIndex()
+
+
+def _newest_rows(
+    limit: int, before: Optional[tuple] = None, email: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Newest-first rows across segments, opening only as many segments as needed."""
     _ensure_local_storage()
-    with open(ANALYSES_FILE, "w") as f:
-        json.dump({"analyses": analyses}, f, indent=2)
+    rows: List[Dict[str, Any]] = []
+    for month, path in _segments():
+        if len(rows) >= limit:
+            break
+        if before is not None and month > before[0][:7] and month != _UNDATED_SEGMENT:
+            # Every row in this segment is newer than the cursor
+            continue
+        cache = _cached_segment(path)
+        source = cache.ordered if email is None else cache.by_user.get(email)
+        if source:
+            rows.extend(source.newest(limit - len(rows), before))
+    return rows
+
+
+def _append_jsonl(path: Path, rows: List[Dict[str, Any]]):
+    """Append rows to a JSONL file (plain or gzipped) with a single fsync'd write."""
+    payload = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in rows)
+    if path.suffix == ".gz":
+        # Each append adds a gzip member; readers see the concatenation
+        with open(path, "ab") as f:
+            f.write(gzip.compress(payload.encode("utf-8")))
+            f.flush()
+            os.fsync(f.fileno())
+        return
+    with open(path, "ab+") as f:
+        # Terminate a torn trailing line so it cannot swallow this record
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                payload = "\n" + payload
+        f.write(payload.encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+
 
+def _append_local_analyses(analyses: List[Dict[str, Any]], replaced: Optional[List[Dict[str, Any]]] = None):
+    """Append analyses to their monthly segments, one fsync'd write per segment.
+    
+    `replaced` are the stored copies these rows overwrite; one that lives
+    in a different month gets a tombstone there so it is not read twice.
+    """
+    _ensure_local_storage()
+    by_month: Dict[str, List[Dict[str, Any]]] = {}
+    for analysis in analyses:
+        by_month.setdefault(_segment_month(analysis), []).append(analysis)
+    new_months = {a["id"]: _segment_month(a) for a in analyses if a.get("id")}
+    for old in replaced or []:
+        old_month = _segment_month(old)
+        if new_months.get(old.get("id"), old_month) != old_month:
+            by_month.setdefault(old_month, []).append({"id": old["id"], _TOMBSTONE: new_months[old["id"]]})
+    
+    with _cache_lock:
+        new_segment = False
+        for month, rows in by_month.items():
+            path = _segment_path(month)
+            before = _file_signature(path)
+            new_segment = new_segment or before is None
+            _append_jsonl(path, rows)
+            after = _file_signature(path)
+            _id_index.note_append(month, rows, before, after)
+            
+            # Keep the cache warm if it reflected the file right before our write
+            cache = _segment_cache.get(path)
+            if cache is not None and cache.signature == before:
+                for row in rows:
+                    cache.add(json.loads(json.dumps(row)))
+                cache.signature = after
+            else:
+                _segment_cache.pop(path, None)
+        if new_segment:
+            # Month rollover: the previous hot segment may now be closed
+            apply_segment_policy()
 
-def get_client() -> Optional[Client]:
+
+def _month_end(month: str) -> datetime:
+    year, mon = int(month[:4]), int(month[5:7])
+    return datetime(year + mon // 12, mon % 12 + 1, 1)
+
+
+def apply_segment_policy(now: Optional[datetime] = None) -> Dict[str, int]:
+    """Compress closed monthly segments and drop expired ones.
+    
+    Ages are measured from the end of the segment's month, using
+    SEGMENT_COMPRESS_AFTER_DAYS and SEGMENT_RETENTION_DAYS. Rows in
+    deleted segments are subtracted from the running stats.
+    """
+    now = now or datetime.now()
+    compressed = deleted = 0
+    with _cache_lock:
+        for month, path in _segments():
+            if month == _UNDATED_SEGMENT:
+                continue
+            age_days = (now - _month_end(month)).days
+            if age_days < 0:
+                continue  # current month is still hot
+            if SEGMENT_RETENTION_DAYS and age_days >= SEGMENT_RETENTION_DAYS:
+                _subtract_stats(_latest_by_id(_read_log(path)))
+                path.unlink()
+                _segment_cache.pop(path, None)
+                deleted += 1
+            elif path.suffix != ".gz" and age_days >= SEGMENT_COMPRESS_AFTER_DAYS:
+                target = path.with_name(path.name + ".gz")
+                tmp = path.with_name(path.name + ".gz.tmp")
+                with open(path, "rb") as src, gzip.open(tmp, "wb") as dst:
+                    dst.writelines(src)
+                with open(tmp, "rb") as f:
+                    os.fsync(f.fileno())
+                os.replace(tmp, target)
+                path.unlink()
+                _segment_cache.pop(path, None)
+                compressed += 1
+    return {"compressed": compressed, "deleted": deleted}
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id TEXT PRIMARY KEY,
+    user_email TEXT,
+    created_at TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL
+);
+-- The primary key already indexes id; drop the redundant index older stores created
+DROP INDEX IF EXISTS idx_analyses_id;
+CREATE INDEX IF NOT EXISTS idx_analyses_user_created ON analyses (user_email, created_at);
+CREATE INDEX IF NOT EXISTS idx_analyses_created ON analyses (created_at);
+CREATE TABLE IF NOT EXISTS users (
+    email TEXT PRIMARY KEY,
+    password_hash TEXT NOT NULL
+);
+"""
+
+_sqlite_local = threading.local()
+_sqlite_init_lock = threading.Lock()
+_sqlite_initialized = False
+
+
+def _sqlite_conn() -> sqlite3.Connection:
+    """Return this thread's SQLite connection, creating the schema on first use."""
+    global _sqlite_initialized
+    conn = getattr(_sqlite_local, "conn", None)
+    if conn is not None:
+        return conn
+    
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    with _sqlite_init_lock:
+        is_new = not SQLITE_FILE.exists()
+        conn = sqlite3.connect(str(SQLITE_FILE), timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if is_new or not _sqlite_initialized:
+            with conn:
+                conn.executescript(_SQLITE_SCHEMA)
+            _sqlite_initialized = True
+        if is_new:
+            _migrate_files_to_sqlite(conn)
+    _sqlite_local.conn = conn
+    return conn
+
+
+def _read_legacy_analyses() -> List[Dict[str, Any]]:
+    """Read analyses from every JSON/JSONL file format as-is, without migrating them."""
+    analyses = []
+    if ANALYSES_FILE.exists():
+        with open(ANALYSES_FILE, "r") as f:
+            analyses.extend(json.load(f).get("analyses", []))
+    if ANALYSES_LOG.exists():
+        analyses.extend(_read_log(ANALYSES_LOG))
+    if SEGMENTS_DIR.exists():
+        for _, path in reversed(_segments()):
+            analyses.extend(_read_log(path))
+    return analyses
+
+
+def _migrate_files_to_sqlite(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Copy analyses and users from the JSON/JSONL files into SQLite."""
+    analyses = _latest_by_id(_read_legacy_analyses())
+    users = {}
+    if USERS_FILE.exists():
+        with open(USERS_FILE, "r") as f:
+            users = json.load(f).get("users", {})
+    
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO analyses (id, user_email, created_at, data) VALUES (?, ?, ?, ?)",
+            [_sqlite_params(a) for a in analyses if a.get("id")],
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (email, password_hash) VALUES (?, ?)",
+            list(users.items()),
+        )
+    return {"analyses": len(analyses), "users": len(users)}
+
+
+def migrate_to_sqlite() -> Dict[str, int]:
+    """Import analyses.json/analyses.jsonl and users.json into the SQLite store.
+    
+    Safe to run repeatedly: rows already present (by id / email) are skipped.
+    """
+    return _migrate_files_to_sqlite(_sqlite_conn())
+
+
+def _sqlite_params(row: Dict[str, Any]) -> tuple:
+    return (row["id"], row.get("user_email"), row.get("created_at", ""), json.dumps(row))
+
+
+def _sqlite_rows(query: str, params: tuple = ()) -> List[Dict[str, Any]]:
+    return [json.loads(data) for (data,) in _sqlite_conn().execute(query, params)]
+
+
+def get_local_user(email: str) -> Optional[str]:
+    """Return the stored password hash for a user in the SQLite store."""
+    row = _sqlite_conn().execute(
+        "SELECT password_hash FROM users WHERE email = ?", (email,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def add_local_user(email: str, password_hash: str) -> bool:
+    """Insert a user into the SQLite store; False if the email is taken."""
+    conn = _sqlite_conn()
+    with conn:
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO users (email, password_hash) VALUES (?, ?)",
+            (email, password_hash),
+        )
+    return cur.rowcount == 1
+
+
+def list_local_users() -> Dict[str, str]:
+    """Return all users in the SQLite store as {email: password_hash}."""
+    return dict(_sqlite_conn().execute("SELECT email, password_hash FROM users ORDER BY email"))
+
+
+def clear_local_users():
+    """Delete all users from the SQLite store."""
+    conn = _sqlite_conn()
+    with conn:
+        conn.execute("DELETE FROM users")
+
+
+# Local backend dispatch
+
+def _local_insert(rows: List[Dict[str, Any]], replaced: Optional[List[Dict[str, Any]]] = None):
+    if LOCAL_BACKEND == "sqlite":
+        conn = _sqlite_conn()
+        with conn:
+            # Re-saved ids replace the stored row (last write wins)
+            conn.executemany(
+                "INSERT INTO analyses (id, user_email, created_at, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET user_email = excluded.user_email, "
+                "created_at = excluded.created_at, data = excluded.data",
+                [_sqlite_params(r) for r in rows],
+            )
+        return
+    _append_local_analyses(rows, replaced)
+
+
+def _local_user_analyses(email: str, limit: int, before: Optional[tuple] = None) -> List[Dict[str, Any]]:
+    if LOCAL_BACKEND == "sqlite":
+        if before is None:
+            return _sqlite_rows(
+                "SELECT data FROM analyses WHERE user_email = ? "
+                "ORDER BY created_at DESC, id DESC LIMIT ?",
+                (email, limit),
+            )
+        return _sqlite_rows(
+            "SELECT data FROM analyses WHERE user_email = ? AND (created_at, id) < (?, ?) "
+            "ORDER BY created_at DESC, id DESC LIMIT ?",
+            (email, before[0], before[1], limit),
+        )
+    return [dict(a) for a in _newest_rows(limit, before, email)]
+
+
+def _local_all_analyses(limit: int, before: Optional[tuple] = None) -> List[Dict[str, Any]]:
+    if LOCAL_BACKEND == "sqlite":
+        if before is None:
+            return _sqlite_rows(
+                "SELECT data FROM analyses ORDER BY created_at DESC, id DESC LIMIT ?", (limit,)
+            )
+        return _sqlite_rows(
+            "SELECT data FROM analyses WHERE (created_at, id) < (?, ?) "
+            "ORDER BY created_at DESC, id DESC LIMIT ?",
+            (before[0], before[1], limit),
+        )
+    return [dict(a) for a in _newest_rows(limit, before)]
+
+
+def _local_get(analysis_id: str) -> Optional[Dict[str, Any]]:
+    if LOCAL_BACKEND == "sqlite":
+        rows = _sqlite_rows("SELECT data FROM analyses WHERE id = ?", (analysis_id,))
+        return rows[0] if rows else None
+    _ensure_local_storage()
+    with _cache_lock:
+        for month in _index_months([analysis_id]):
+            analysis = _cached_segment(_segment_path(month)).by_id.get(analysis_id)
+            if analysis:
+                return dict(analysis)
+    return None
+
+
+def read_local_analyses() -> List[Dict[str, Any]]:
+    """Return every analysis in the local store, in insertion order."""
+    if LOCAL_BACKEND == "sqlite":
+        return _sqlite_rows("SELECT data FROM analyses ORDER BY rowid")
+    if not SEGMENTS_DIR.exists() and not ANALYSES_LOG.exists() and not ANALYSES_FILE.exists():
+        return []
+    return _load_local_analyses()
+
+
+def clear_local_analyses():
+    """Delete all locally stored analyses."""
+    if LOCAL_BACKEND == "sqlite":
+        conn = _sqlite_conn()
+        with conn:
+            conn.execute("DELETE FROM analyses")
+    else:
+        with _cache_lock:
+            if SEGMENTS_DIR.exists():
+                for _, path in _segments():
+                    path.unlink()
+            for path in (ANALYSES_LOG, ANALYSES_FILE):
+                if path.exists():
+                    path.unlink()
+            _invalidate_cache()
+    # The counters are recounted from what is left on the next read
+    with _stats_lock:
+        if STATS_FILE.exists():
+            STATS_FILE.unlink()
+
+
+class CircuitBreaker:
+    """Circuit breaker guarding the Supabase path.
+    
+    closed:    calls go through; consecutive failures are counted.
+    open:      calls are refused (callers go straight to local storage)
+               until the current backoff delay has elapsed.
+    half_open: a single probe call is let through; success closes the
+               breaker, failure re-opens it with the delay doubled.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, base_delay: float = 5.0, max_delay: float = 300.0):
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._delay = base_delay
+        self._opened_at = 0.0
+        self._probe_started = 0.0
+
+    def allow(self) -> bool:
+        """Return True if a Supabase call may be attempted now."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if self._state == self.OPEN:
+                if now - self._opened_at < self._delay:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probe_started = now
+                return True
+            # Half-open: one probe at a time; re-issue if the probe never reported back
+            if now - self._probe_started >= self._delay:
+                self._probe_started = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._delay = self.base_delay
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN:
+                self._delay = min(self._delay * 2, self.max_delay)
+            elif self._state == self.CLOSED and self._failures < self.failure_threshold:
+                return
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current state, consecutive failures and seconds until the next probe."""
+        with self._lock:
+            retry_in = 0.0
+            if self._state == self.OPEN:
+                retry_in = max(0.0, self._opened_at + self._delay - time.monotonic())
+            return {
+                "state": self._state,
+                "failures": self._failures,
+                "retry_in": round(retry_in, 1),
+                "backoff": self._delay,
+            }
+
+
+_breaker = CircuitBreaker(
+    failure_threshold=int(_get_setting("SUPABASE_BREAKER_THRESHOLD", "3")),
+    base_delay=float(_get_setting("SUPABASE_BREAKER_DELAY", "5")),
+    max_delay=float(_get_setting("SUPABASE_BREAKER_MAX_DELAY", "300")),
+)
+
+
+def get_client() -> Optional["Client"]:
     """Initialize and return Supabase client if available."""
     global _client
     if _client:
@@ -55,110 +825,746 @@ def get_client() -> Optional[Client]:
     if not SUPABASE_AVAILABLE:
         return None
     
-    url = None
-    key = None
-    if st is not None:
-        try:
-            url = st.secrets.get("SUPABASE_URL")
-            key = st.secrets.get("SUPABASE_KEY")
-        except Exception:
-            pass
-    url = url or os.environ.get("SUPABASE_URL")
-    key = key or os.environ.get("SUPABASE_KEY")
+    url = _get_setting("SUPABASE_URL")
+    key = _get_setting("SUPABASE_KEY")
     
     if not url or not key:
         return None
     
     try:
+        from supabase import create_client
         _client = create_client(url, key)
         return _client
     except Exception:
         return None
 
 
-def save_analysis(row: Dict[str, Any]) -> Dict[str, Any]:
-    """Save a sleep analysis record to the database (Supabase or local)."""
+def _remote_client() -> Optional["Client"]:
+    """Return the Supabase client unless it is unconfigured or the breaker is open."""
     client = get_client()
+    if client is None or not _breaker.allow():
+        return None
+    return client
+
+
+def supabase_status() -> Dict[str, Any]:
+    """Report whether Supabase is configured and the circuit breaker state."""
+    status = _breaker.snapshot()
+    status["configured"] = get_client() is not None
+    status["outbox_error"] = _outbox_error
+    status["missing_columns"] = sorted(_missing_columns)
+    return status
+
+
+_outbox_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_flush_wakeup = threading.Event()
+_flusher_lock = threading.Lock()
+_flusher: Optional[threading.Thread] = None
+FLUSH_INTERVAL = float(_get_setting("SUPABASE_FLUSH_INTERVAL", "2"))
+FLUSH_BATCH_SIZE = int(_get_setting("SUPABASE_FLUSH_BATCH_SIZE", "500"))
+
+
+def _spool(rows: List[Dict[str, Any]]):
+    """Durably queue rows for the background Supabase flusher."""
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    with _outbox_lock:
+        _append_jsonl(OUTBOX_FILE, rows)
+    _start_flusher()
+    _flush_wakeup.set()
+
+
+def _pending_rows() -> List[Dict[str, Any]]:
+    """Rows spooled for Supabase that are not in it yet, including rejected ones."""
+    with _outbox_lock:
+        rows = []
+        if OUTBOX_REJECTED_FILE.exists():
+            rows.extend(entry["row"] for entry in _read_log(OUTBOX_REJECTED_FILE) if "row" in entry)
+        spooled = 0
+        for path in (OUTBOX_INFLIGHT_FILE, OUTBOX_FILE):
+            if path.exists():
+                batch = _read_log(path)
+                spooled += len(batch)
+                rows.extend(batch)
+    if spooled:
+        _start_flusher()
+    return rows
+
+
+# PostgREST/Postgres error codes for requests the server refused outright:
+# data exceptions (22), constraint violations (23), bad columns/syntax (42)
+# and PostgREST request errors (PGRST1xx/2xx). Retrying these never helps.
+_REJECTED_CODE = re.compile(r"^(22|23|42|PGRST[12])")
+# Of those, the ones about the table itself (unknown column or table): every
+# row fails the same way, so the batch waits for the schema to be fixed
+_SCHEMA_CODES = {"42703", "42P01", "PGRST204", "PGRST205"}
+
+# Last schema error that stopped the outbox, for status displays
+_outbox_error: Optional[str] = None
+
+
+class OutboxSchemaError(Exception):
+    """Supabase refused a whole batch because the table does not match the rows."""
+
+
+def _rejection_kind(exc: Exception) -> Optional[str]:
+    """"schema" or "row" if Supabase answered and refused the request; None for transport failures."""
+    try:
+        from postgrest.exceptions import APIError
+    except ImportError:
+        return None
+    if not isinstance(exc, APIError):
+        return None
+    code = str(exc.code or "")
+    if code in _SCHEMA_CODES:
+        return "schema"
+    return "row" if _REJECTED_CODE.match(code) else None
+
+
+def _is_rejection(exc: Exception) -> bool:
+    """True if Supabase answered and refused the request; False for transport failures."""
+    return _rejection_kind(exc) is not None
+
+
+# Columns the Supabase table lacks (e.g. fields added since it was created); left out of writes
+_missing_columns: set = set()
+_MISSING_COLUMN_RE = re.compile(r"'(\w+)' column|column \"?(?:\w+\.)?(\w+)\"? (?:of relation|does not exist)")
+
+
+def _missing_column(exc: Exception) -> Optional[str]:
+    """The unknown column a Supabase write was refused for, if that was the cause."""
+    if _rejection_kind(exc) != "schema" or str(exc.code or "") not in ("PGRST204", "42703"):
+        return None
+    match = _MISSING_COLUMN_RE.search(f"{getattr(exc, 'message', '')} {exc}")
+    return (match.group(1) or match.group(2)) if match else None
+
+
+def _upsert_remote(client: "Client", rows: List[Dict[str, Any]]):
+    """Upsert rows into Supabase, dropping columns the table does not have.
+    
+    Each unknown column is recorded once, reported by supabase_status()
+    and stripped from later writes until the process restarts (run the
+    ALTER TABLE from the README to keep those fields remotely).
+    """
+    while True:
+        payload = rows
+        if _missing_columns:
+            payload = [{k: v for k, v in row.items() if k not in _missing_columns} for row in rows]
+        try:
+            client.table("analyses").upsert(payload, on_conflict="id", ignore_duplicates=False).execute()
+            return
+        except Exception as e:
+            column = _missing_column(e)
+            if column is None or column in _missing_columns:
+                raise
+            _missing_columns.add(column)
+
+
+def _upsert_rows(client: "Client", rows: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], str]]:
+    """Upsert rows, narrowing a rejected batch down to the rows that cause it.
     
-    # Ensure ID and timestamp
+    Returns the rejected (row, error) pairs. Schema errors raise
+    OutboxSchemaError without splitting; transport errors propagate.
+    """
+    try:
+        _upsert_remote(client, rows)
+        return []
+    except Exception as e:
+        kind = _rejection_kind(e)
+        if kind is None:
+            raise
+        if kind == "schema":
+            raise OutboxSchemaError(str(e)) from e
+        if len(rows) == 1:
+            return [(rows[0], str(e))]
+    mid = len(rows) // 2
+    return _upsert_rows(client, rows[:mid]) + _upsert_rows(client, rows[mid:])
+
+
+def flush_outbox() -> int:
+    """Push spooled rows to Supabase in bulk; returns the number of rows flushed.
+    
+    Rows are upserted on `id` (an existing row takes the new values), so a
+    batch re-sent after a crash or partial failure is not written twice. Rows
+    Supabase rejects are moved to OUTBOX_REJECTED_FILE so they cannot
+    block the rows behind them (reads keep serving them). A schema error
+    (unknown column or table) leaves the whole batch spooled and is
+    reported by supabase_status() until the table is fixed. Only
+    transport errors count against the circuit breaker.
+    """
+    global _outbox_error
+    with _flush_lock:
+        with _outbox_lock:
+            # Rotate the outbox so new saves keep appending while we flush
+            if not OUTBOX_INFLIGHT_FILE.exists():
+                if not OUTBOX_FILE.exists() or OUTBOX_FILE.stat().st_size == 0:
+                    return 0
+                os.replace(OUTBOX_FILE, OUTBOX_INFLIGHT_FILE)
+            rows = _read_log(OUTBOX_INFLIGHT_FILE)
+            if not rows:
+                OUTBOX_INFLIGHT_FILE.unlink()
+                return 0
+        
+        # Only ask the breaker once there is work, so an idle flusher never takes the probe
+        client = _remote_client()
+        if client is None:
+            return 0
+        
+        rejected = []
+        try:
+            for start in range(0, len(rows), FLUSH_BATCH_SIZE):
+                rejected.extend(_upsert_rows(client, rows[start:start + FLUSH_BATCH_SIZE]))
+            _breaker.record_success()
+            _outbox_error = None
+        except OutboxSchemaError as e:
+            # Supabase is reachable; the rows stay spooled (and readable) until the table is fixed
+            _breaker.record_success()
+            _outbox_error = str(e)
+            return 0
+        except Exception:
+            # Leave the in-flight file in place; it is retried on the next pass
+            _breaker.record_failure()
+            return 0
+        
+        with _outbox_lock:
+            if rejected:
+                _append_jsonl(OUTBOX_REJECTED_FILE, [{"error": error, "row": row} for row, error in rejected])
+            OUTBOX_INFLIGHT_FILE.unlink()
+        return len(rows) - len(rejected)
+
+
+def _flusher_loop():
+    while True:
+        _flush_wakeup.wait(FLUSH_INTERVAL)
+        _flush_wakeup.clear()
+        try:
+            flush_outbox()
+        except Exception:
+            pass
+
+
+def _flush_on_exit():
+    """Last flush at shutdown, so saves already confirmed are not lost with an ephemeral disk."""
+    try:
+        flush_outbox()
+    except Exception:
+        pass
+
+
+def _install_exit_flush():
+    atexit.register(_flush_on_exit)
+    # Without a handler SIGTERM kills the process before atexit runs. Signal handlers
+    # can only be set from the main thread; under Streamlit (scripts run in other
+    # threads) the server's own SIGTERM handling shuts down cleanly and runs atexit.
+    if threading.current_thread() is threading.main_thread() and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+
+
+def _start_flusher():
+    """Start the background flusher thread (and the shutdown flush) once per process."""
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _flusher_lock:
+        if _flusher is None:
+            _install_exit_flush()
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flusher_loop, name="supabase-flusher", daemon=True)
+            _flusher.start()
+
+
+def requeue_local_analyses() -> int:
+    """Queue every row in the local store for upload to Supabase.
+    
+    Recovers records that were saved locally while Supabase was
+    unavailable; rows already present remotely are skipped by id.
+    """
+    rows = read_local_analyses()
+    if rows:
+        _spool(rows)
+    return len(rows)
+
+
+def requeue_rejected() -> int:
+    """Spool the rows Supabase rejected again, e.g. after fixing the table or the data."""
+    with _outbox_lock:
+        if not OUTBOX_REJECTED_FILE.exists():
+            return 0
+        rows = [entry["row"] for entry in _read_log(OUTBOX_REJECTED_FILE) if "row" in entry]
+        OUTBOX_REJECTED_FILE.unlink()
+    if rows:
+        _spool(rows)
+    return len(rows)
+
+
+def _merge_pending(
+    rows: List[Dict[str, Any]], limit: int, before: Optional[tuple], email: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Merge not-yet-flushed spooled rows into a newest-first page fetch."""
+    pending = [
+        r for r in _pending_rows()
+        if (email is None or r.get("user_email") == email)
+        and (before is None or _sort_key(r) < before)
+    ]
+    if not pending:
+        return rows
+    merged = {r.get("id"): r for r in rows}
+    for r in pending:
+        # Spooled rows are newer than what Supabase has, and later spools win
+        merged[r.get("id")] = r
+    return sorted(merged.values(), key=_sort_key, reverse=True)[:limit]
+
+
+def _prepare_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Ensure a record has an ID and timestamp."""
     if "id" not in row:
         row["id"] = str(uuid.uuid4())
     if "created_at" not in row:
         row["created_at"] = datetime.now().isoformat()
+    return row
+
+
+def _stored_versions(ids: List[str]) -> List[Dict[str, Any]]:
+    """Currently stored copies of the given ids, i.e. the rows a save is about to replace."""
+    if not ids:
+        return []
+    wanted = set(ids)
+    found: Dict[str, Dict[str, Any]] = {}
+    if get_client() is not None:
+        client = _remote_client()
+        if client:
+            try:
+                for start in range(0, len(ids), 200):
+                    res = client.table("analyses").select("*").in_("id", ids[start:start + 200]).execute()
+                    found.update((r["id"], r) for r in res.data or [])
+                _breaker.record_success()
+            except Exception:
+                _breaker.record_failure()
+        for row in _pending_rows():
+            if row.get("id") in wanted:
+                found[row["id"]] = row
+    elif LOCAL_BACKEND == "sqlite":
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for row in _sqlite_rows(f"SELECT data FROM analyses WHERE id IN ({placeholders})", tuple(chunk)):
+                found[row["id"]] = row
+    else:
+        # One index refresh, then each holding segment is read once; cold
+        # months are parsed directly so they do not evict the hot ones
+        _ensure_local_storage()
+        with _cache_lock:
+            for month, month_ids in _index_months(ids).items():
+                path = _segment_path(month)
+                cache = _segment_cache.get(path)
+                if cache is not None and cache.signature == _file_signature(path):
+                    rows = [cache.by_id[i] for i in month_ids if i in cache.by_id]
+                else:
+                    month_set = set(month_ids)
+                    rows = [r for r in _read_log(path) if r.get("id") in month_set]
+                # Later copies of an id win
+                found.update((r["id"], dict(r)) for r in rows)
+    return list(found.values())
+
+
+def save_analysis(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Save a sleep analysis record to the database (Supabase or local).
     
-    if client:
-        try:
-            res = client.table("analyses").insert(row).execute()
-            return res.data[0] if res.data else row
-        except Exception as e:
-            # Fallback to local storage if Supabase fails
-            pass
+    With Supabase configured the row is appended to a durable local spool
+    and written to Supabase by a background flusher, so the caller only
+    pays for a local append. Saving a row whose id already exists
+    replaces the stored row.
+    """
+    replaced = _stored_versions([row["id"]]) if row.get("id") else []
+    _prepare_row(row)
     
-    # Use local storage
-    analyses = _load_local_analyses()
-    analyses.append(row)
-    _save_local_analyses(analyses)
+    if get_client() is not None:
+        _spool([row])
+    else:
+        # Use local storage
+        _local_insert([row], replaced)
+    _update_stats([row], replaced)
     return row
 
 
-def list_user_analyses(email: str, limit: int = 50) -> List[Dict[str, Any]]:
-    """List all analyses for a specific user."""
-    client = get_client()
+def save_analyses_batch(rows: List[Dict[str, Any]], chunk_size: int = 1000) -> List[Dict[str, Any]]:
+    """Save many analysis records at once (imports, re-scoring jobs).
+    
+    Supabase gets one bulk upsert per `chunk_size` rows; any chunk that
+    cannot be written is spooled for the background flusher. Locally the
+    whole batch is a single append (JSONL) or transaction (SQLite).
+    Rows whose id already exists replace the stored row on every backend
+    (last write wins), and are not counted twice in the stats.
+    Returns the stored rows with their assigned ids.
+    """
+    replaced = _stored_versions(list(dict.fromkeys(row["id"] for row in rows if row.get("id"))))
+    rows = [_prepare_row(row) for row in rows]
+    if not rows:
+        return rows
+    saved = rows
+    # One copy per id: Postgres cannot upsert the same id twice in one statement
+    rows = _latest_by_id(rows)
+    
+    if get_client() is not None:
+        start = 0
+        client = _remote_client()
+        if client:
+            try:
+                for start in range(0, len(rows), chunk_size):
+                    chunk = rows[start:start + chunk_size]
+                    _upsert_remote(client, chunk)
+                start = len(rows)
+                _breaker.record_success()
+            except Exception as e:
+                # A rejected chunk is spooled too; the flusher sets its bad rows aside
+                if _is_rejection(e):
+                    _breaker.record_success()
+                else:
+                    _breaker.record_failure()
+        if start < len(rows):
+            _spool(rows[start:])
+    else:
+        # Use local storage
+        _local_insert(rows, replaced)
+    _update_stats(rows, replaced)
+    return saved
+
+
+def _encode_cursor(row: Dict[str, Any]) -> str:
+    """Opaque keyset cursor for the (created_at, id) position of `row`."""
+    raw = json.dumps(list(_sort_key(row)), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[tuple]:
+    if not cursor:
+        return None
+    try:
+        created_at, analysis_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError(f"Invalid pagination cursor: {cursor!r}")
+    return (str(created_at), str(analysis_id))
+
+
+def _page_result(rows: List[Dict[str, Any]], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Trim a limit+1 fetch to `limit` rows and derive the next cursor."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, _encode_cursor(rows[-1])
+    return rows, None
+
+
+def _select_list(columns: Optional[List[str]]) -> str:
+    """PostgREST select string; the cursor columns are always included."""
+    if not columns:
+        return "*"
+    return ",".join(dict.fromkeys(list(columns) + ["created_at", "id"]))
+
+
+def _project(rows: List[Dict[str, Any]], columns: Optional[List[str]]) -> List[Dict[str, Any]]:
+    if not columns:
+        return rows
+    keep = list(dict.fromkeys(list(columns) + ["created_at", "id"]))
+    return [{k: r.get(k) for k in keep} for r in rows]
+
+
+def _remote_page(query, limit: int, before: Optional[tuple]):
+    if before is not None:
+        created_at, analysis_id = before
+        query = query.or_(
+            f'created_at.lt."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.lt."{analysis_id}")'
+        )
+    return (
+        query.order("created_at", desc=True)
+        .order("id", desc=True)
+        .limit(limit + 1)
+        .execute()
+    )
+
+
+def page_user_analyses(
+    email: str, limit: int = 50, cursor: Optional[str] = None, columns: Optional[List[str]] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Return one page of a user's analyses, newest first, plus the next-page cursor.
+    
+    Pass the returned cursor back in to fetch the following page; it is
+    None once the last page has been reached. `columns` limits the fields
+    returned (`id` and `created_at` are always included); use
+    get_analysis_by_id for the full record.
+    """
+    before = _decode_cursor(cursor)
+    client = _remote_client()
+    rows = None
     
     if client:
         try:
-            res = (
-                client.table("analyses")
-                .select("*")
-                .eq("user_email", email)
-                .order("created_at", desc=True)
-                .limit(limit)
-                .execute()
-            )
-            return res.data or []
+            query = client.table("analyses").select(_select_list(columns)).eq("user_email", email)
+            res = _remote_page(query, limit, before)
+            _breaker.record_success()
+            rows = res.data or []
         except Exception:
-            pass
+            _breaker.record_failure()
     
-    # Use local storage
-    analyses = _load_local_analyses()
-    user_analyses = [a for a in analyses if a.get("user_email") == email]
-    user_analyses.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-    return user_analyses[:limit]
+    if rows is None:
+        # Use local storage
+        rows = _local_user_analyses(email, limit + 1, before)
+    return _page_result(_project(_merge_pending(rows, limit + 1, before, email), columns), limit)
 
 
-def list_all_analyses(limit: int = 200) -> List[Dict[str, Any]]:
-    """List all analyses (admin view)."""
-    client = get_client()
+def page_all_analyses(
+    limit: int = 200, cursor: Optional[str] = None, columns: Optional[List[str]] = None,
+    strict: bool = False,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Return one page of all analyses (admin view), newest first, plus the next-page cursor.
+    
+    `columns` works as in page_user_analyses. With `strict`, a configured
+    Supabase that cannot be read raises instead of falling back to the
+    local store.
+    """
+    before = _decode_cursor(cursor)
+    client = _remote_client()
+    rows = None
+    if strict and client is None and get_client() is not None:
+        raise RuntimeError("Supabase is unavailable (circuit breaker open)")
     
     if client:
         try:
-            res = client.table("analyses").select("*").order("created_at", desc=True).limit(limit).execute()
-            return res.data or []
+            res = _remote_page(client.table("analyses").select(_select_list(columns)), limit, before)
+            _breaker.record_success()
+            rows = res.data or []
         except Exception:
-            pass
+            _breaker.record_failure()
+            if strict:
+                raise
     
-    # Use local storage
-    analyses = _load_local_analyses()
-    analyses.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-    return analyses[:limit]
+    if rows is None:
+        # Use local storage
+        rows = _local_all_analyses(limit + 1, before)
+    return _page_result(_project(_merge_pending(rows, limit + 1, before), columns), limit)
+
+
+def list_user_analyses(email: str, limit: int = 50, columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """List all analyses for a specific user."""
+    return page_user_analyses(email, limit, columns=columns)[0]
+
+
+def list_all_analyses(limit: int = 200, columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """List all analyses (admin view)."""
+    return page_all_analyses(limit, columns=columns)[0]
 
 
 def get_analysis_by_id(analysis_id: str) -> Optional[Dict[str, Any]]:
     """Get a specific analysis by ID."""
-    client = get_client()
+    # Rows still waiting in the write-behind spool; the latest spooled copy wins
+    for row in reversed(_pending_rows()):
+        if row.get("id") == analysis_id:
+            return row
+    
+    client = _remote_client()
     
     if client:
         try:
             res = client.table("analyses").select("*").eq("id", analysis_id).limit(1).execute()
+            _breaker.record_success()
             rows = res.data or []
             return rows[0] if rows else None
         except Exception:
-            pass
+            _breaker.record_failure()
     
     # Use local storage
-    analyses = _load_local_analyses()
-    for analysis in analyses:
-        if analysis.get("id") == analysis_id:
-            return analysis
-    return None
+    return _local_get(analysis_id)
+
+
+_stats_lock = threading.Lock()
+_STAT_GROUPS = ("by_severity", "by_diagnosis", "by_day", "by_model")
+
+
+def _empty_stats() -> Dict[str, Any]:
+    stats: Dict[str, Any] = {"total": 0}
+    for group in _STAT_GROUPS:
+        stats[group] = {}
+    return stats
 
+
+def _count_into(stats: Dict[str, Any], rows: List[Dict[str, Any]], sign: int = 1):
+    for row in rows:
+        stats["total"] += sign
+        keys = {
+            "by_severity": str(row.get("severity")),
+            "by_diagnosis": str(row.get("diagnosis") or "Unknown"),
+            "by_day": str(row.get("created_at") or "")[:10] or "unknown",
+            "by_model": str(row.get("ml_model_used") or "Unknown"),
+        }
+        for group, key in keys.items():
+            count = stats[group].get(key, 0) + sign
+            if count > 0:
+                stats[group][key] = count
+            else:
+                stats[group].pop(key, None)
+
+
+def _write_stats(stats: Dict[str, Any]):
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = STATS_FILE.with_suffix(".json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(stats, f)
+    os.replace(tmp, STATS_FILE)
+
+
+def _update_stats(rows: List[Dict[str, Any]], replaced: Optional[List[Dict[str, Any]]] = None):
+    """Add newly saved rows to the persisted counters, minus the stored rows they replaced."""
+    with _stats_lock:
+        if STATS_FILE.exists():
+            with open(STATS_FILE, "r") as f:
+                stats = json.load(f)
+            _count_into(stats, replaced or [], sign=-1)
+            _count_into(stats, rows)
+            _write_stats(stats)
+            return
+    # First use on existing data: counting everything includes these rows.
+    # Counted outside _stats_lock, which segment deletion takes under _cache_lock
+    rebuild_stats()
+
+
+def _subtract_stats(rows: List[Dict[str, Any]]):
+    """Remove deleted rows from the persisted counters (nothing to do before first use)."""
+    with _stats_lock:
+        if not STATS_FILE.exists():
+            return
+        with open(STATS_FILE, "r") as f:
+            stats = json.load(f)
+        _count_into(stats, rows, sign=-1)
+        _write_stats(stats)
+
+
+def iter_analyses(page_size: int = 1000, columns: Optional[List[str]] = None, strict: bool = False):
+    """Yield every analysis newest first, one keyset page in memory at a time.
+    
+    `strict` works as in page_all_analyses.
+    """
+    cursor = None
+    while True:
+        rows, cursor = page_all_analyses(limit=page_size, cursor=cursor, columns=columns, strict=strict)
+        yield from rows
+        if cursor is None:
+            return
+
+
+def _compute_stats(strict: bool = False) -> Dict[str, Any]:
+    stats = _empty_stats()
+    columns = ["severity", "diagnosis", "ml_model_used"]
+    batch: List[Dict[str, Any]] = []
+    for row in iter_analyses(columns=columns, strict=strict):
+        batch.append(row)
+        if len(batch) >= 1000:
+            _count_into(stats, batch)
+            batch = []
+    _count_into(stats, batch)
+    return stats
+
+
+def rebuild_stats(strict: bool = False) -> Dict[str, Any]:
+    """Recount all analyses from scratch and persist the counters.
+    
+    `strict` works as in page_all_analyses.
+    """
+    stats = _compute_stats(strict)
+    with _stats_lock:
+        _write_stats(stats)
+    return stats
+
+
+STATS_VERIFY_INTERVAL = float(_get_setting("STATS_VERIFY_INTERVAL", "300"))
+_stats_verified_at: Optional[float] = None
+
+
+def _remote_count() -> Optional[int]:
+    """Exact number of rows in the Supabase table, or None if it cannot be read."""
+    client = _remote_client()
+    if not client:
+        return None
+    try:
+        res = client.table("analyses").select("id", count="exact").limit(1).execute()
+        _breaker.record_success()
+        return res.count
+    except Exception:
+        _breaker.record_failure()
+        return None
+
+
+def _verify_stats(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Recount from Supabase if the counters disagree with its row count.
+    
+    Runs at most every STATS_VERIFY_INTERVAL seconds and not while saves
+    are still spooled. Rejected rows are counted here but never reach
+    Supabase, so the total may exceed the remote count by that many.
+    """
+    global _stats_verified_at
+    now = time.monotonic()
+    if _stats_verified_at is not None and now - _stats_verified_at < STATS_VERIFY_INTERVAL:
+        return stats
+    _stats_verified_at = now
+    with _outbox_lock:
+        if any(p.exists() and p.stat().st_size for p in (OUTBOX_FILE, OUTBOX_INFLIGHT_FILE)):
+            return stats
+        rejected = len(_read_log(OUTBOX_REJECTED_FILE)) if OUTBOX_REJECTED_FILE.exists() else 0
+    count = _remote_count()
+    if count is None or count <= stats.get("total", 0) <= count + rejected:
+        return stats
+    try:
+        return rebuild_stats(strict=True)
+    except Exception:
+        # Supabase went away mid-recount; keep the counters and retry next interval
+        return stats
+
+
+def get_stats() -> Dict[str, Any]:
+    """Running counts: total, by_severity, by_diagnosis, by_day (YYYY-MM-DD) and by_model.
+    
+    Severity keys are strings ("0".."3"). Counts are maintained on every
+    save, so reading them does not touch the analyses themselves.
+    
+    The counters live in this instance's STATS_FILE. With Supabase, saves
+    made by other instances are not seen here, so every
+    STATS_VERIFY_INTERVAL seconds the total is checked against the
+    table's row count and everything is recounted on a mismatch.
+    """
+    with _stats_lock:
+        stats = None
+        if STATS_FILE.exists():
+            with open(STATS_FILE, "r") as f:
+                stats = json.load(f)
+    if stats is None:
+        return rebuild_stats()
+    if get_client() is not None:
+        return _verify_stats(stats)
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Local storage maintenance")
+    parser.add_argument(
+        "command",
+        choices=["migrate-sqlite", "flush-outbox", "requeue-local", "requeue-rejected",
+                 "apply-segment-policy", "rebuild-stats"],
+    )
+    args = parser.parse_args()
+    
+    if args.command == "migrate-sqlite":
+        print(migrate_to_sqlite())
+    elif args.command == "flush-outbox":
+        print(f"Flushed {flush_outbox()} rows to Supabase")
+    elif args.command == "requeue-local":
+        print(f"Queued {requeue_local_analyses()} local rows for Supabase")
+        print(f"Flushed {flush_outbox()} rows to Supabase")
+    elif args.command == "requeue-rejected":
+        print(f"Queued {requeue_rejected()} rejected rows for Supabase")
+        print(f"Flushed {flush_outbox()} rows to Supabase")
+    elif args.command == "apply-segment-policy":
+        _ensure_local_storage()
+        print(apply_segment_policy())
+    elif args.command == "rebuild-stats":
+        print(json.dumps(rebuild_stats(), indent=2))
@@ -0,0 +1,133 @@
+"""
+Bulk PDF export.
+
+Renders the report of every analysis in a date range across a process
+pool and streams the PDFs into a ZIP on disk as they complete, so memory
+stays flat no matter how many reports are exported.
+"""
+import multiprocessing
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from lib.db import iter_analyses
+from lib.pdf import build_report, read_cached_report
+
+EXPORT_DIR = Path(__file__).parent.parent / ".data" / "exports"
+# Render processes for bulk export (1 = render in-process)
+EXPORT_WORKERS = int(os.environ.get("EXPORT_WORKERS", str(os.cpu_count() or 1)))
+# Reports per worker task, and finished exports kept on disk
+EXPORT_CHUNK_SIZE = 16
+EXPORT_KEEP = 5
+
+
+def iter_analyses_between(start: date, end: date, severities: Optional[Iterable[int]] = None,
+                          columns: Optional[List[str]] = None) -> Iterator[Dict]:
+    """Stored analyses created on days start..end (inclusive), newest first."""
+    start_day, end_day = start.isoformat(), end.isoformat()
+    severities = set(severities) if severities is not None else None
+    if columns is not None and severities is not None and "severity" not in columns:
+        columns = columns + ["severity"]
+    for row in iter_analyses(page_size=500, columns=columns):
+        day = str(row.get("created_at") or "")[:10]
+        if day < start_day:
+            # Keyset order is newest first; everything after this is older
+            return
+        if day > end_day:
+            continue
+        if severities is not None and row.get("severity") not in severities:
+            continue
+        yield row
+
+
+def _report_name(row: Dict) -> str:
+    return f"sleep_report_{row.get('id', 'unknown')}.pdf"
+
+
+def _render_chunk(rows: List[Dict]) -> List[Tuple[str, bytes]]:
+    """
+    Render one chunk of reports; runs in an export worker process.
+    
+    Reports already in the cache are reused; the rest are built without
+    being cached, so an export does not flush the reports people view.
+    """
+    return [(_report_name(row), read_cached_report(row, touch=False) or build_report(row)) for row in rows]
+
+
+def _chunks(rows: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _prune_exports():
+    """Keep only the newest EXPORT_KEEP finished exports."""
+    exports = sorted(EXPORT_DIR.glob("*.zip"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for path in exports[EXPORT_KEEP:]:
+        path.unlink(missing_ok=True)
+
+
+def export_reports_zip(start: date, end: date, severities: Optional[Iterable[int]] = None,
+                       progress: Optional[Callable[[int, int], None]] = None,
+                       workers: Optional[int] = None) -> Tuple[Path, int]:
+    """
+    Write the PDF report of every analysis in start..end into a ZIP under .data/exports.
+
+    Rows are streamed from the database and rendered in chunks across
+    `workers` processes (EXPORT_WORKERS by default), with at most a few
+    chunks per worker in flight. Each finished chunk is written to the
+    archive straight away, so neither the rows nor the PDFs are ever all
+    in memory. Reports come from the lib.pdf disk cache when present.
+    progress(done, total) is called after every chunk.
+
+    Returns (zip_path, report_count).
+    """
+    workers = EXPORT_WORKERS if workers is None else workers
+    severities = list(severities) if severities is not None else None
+    total = sum(1 for _ in iter_analyses_between(start, end, severities, columns=["created_at"]))
+
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = EXPORT_DIR / f"reports_{start.isoformat()}_{end.isoformat()}_{stamp}.zip"
+    tmp = path.with_suffix(".zip.tmp")
+
+    done = 0
+    if progress:
+        progress(done, total)
+    chunks = _chunks(iter_analyses_between(start, end, severities), EXPORT_CHUNK_SIZE)
+    with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        def write(rendered: List[Tuple[str, bytes]]):
+            nonlocal done
+            for name, pdf_bytes in rendered:
+                archive.writestr(name, pdf_bytes)
+            done += len(rendered)
+            if progress:
+                progress(done, total)
+
+        if workers <= 1:
+            for chunk in chunks:
+                write(_render_chunk(chunk))
+        else:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                # Bounded window of in-flight chunks, written in submission order
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.submit(_render_chunk, chunk))
+                    if len(pending) >= workers * 4:
+                        write(pending.popleft().result())
+                while pending:
+                    write(pending.popleft().result())
+
+    os.replace(tmp, path)
+    _prune_exports()
+    return path, done
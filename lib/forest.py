@@ -0,0 +1,94 @@
+from typing import List
+import numpy as np
+
+
+class CompiledForest:
+    """
+    NumPy-only inference for a fitted sklearn RandomForestClassifier.
+
+    All trees are flattened into contiguous node arrays (feature, threshold,
+    left/right child, normalized leaf values). Leaves point to themselves,
+    so every row walks every tree in lock-step for max_depth vectorized
+    steps with no per-call validation or joblib dispatch.
+
+    predict_proba returns exactly what the sklearn forest returns: inputs
+    are compared as float32 like sklearn's trees, and tree probabilities
+    are accumulated in estimator order before dividing by the tree count.
+    """
+
+    def __init__(self, feature, threshold, left, right, leaf_proba, roots, classes, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.leaf_proba = leaf_proba
+        self.roots = roots
+        self.classes_ = classes
+        self.max_depth = max_depth
+
+    @classmethod
+    def from_sklearn(cls, forest) -> "CompiledForest":
+        features: List[np.ndarray] = []
+        thresholds: List[np.ndarray] = []
+        lefts: List[np.ndarray] = []
+        rights: List[np.ndarray] = []
+        probas: List[np.ndarray] = []
+        roots = []
+        offset = 0
+        max_depth = 0
+
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes, dtype=np.intp)
+            is_leaf = tree.children_left == -1
+
+            # Leaves loop back to themselves so extra steps are no-ops
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.intp))
+            thresholds.append(tree.threshold.astype(np.float64))
+
+            # Same normalization as DecisionTreeClassifier.predict_proba
+            proba = tree.value[:, 0, :forest.n_classes_].astype(np.float64)
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            probas.append(proba / normalizer)
+
+            roots.append(offset)
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            leaf_proba=np.concatenate(probas),
+            roots=np.array(roots, dtype=np.intp),
+            classes=np.asarray(forest.classes_),
+            max_depth=max_depth,
+        )
+
+    def apply(self, X) -> np.ndarray:
+        """Leaf node index (into the flattened arrays) per row and tree."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_proba(self, X) -> np.ndarray:
+        leaves = self.apply(X)
+        proba = np.zeros((leaves.shape[0], self.leaf_proba.shape[1]), dtype=np.float64)
+        for t in range(leaves.shape[1]):
+            proba += self.leaf_proba[leaves[:, t]]
+        proba /= leaves.shape[1]
+        return proba
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
@@ -0,0 +1,152 @@
+"""
+Out-of-process model inference.
+
+A pool of spawned worker processes loads the models from the registry
+once per worker and serves classify_batch requests, so CPU-bound sklearn
+calls run on other cores instead of contending on the GIL with
+Streamlit's script threads. Enabled with INFERENCE_WORKERS > 0;
+lib.ml.classify_batch is the client and falls back to in-process
+inference whenever infer_remote() returns None.
+
+start_pool() spawns every worker up front, once the parent has the
+models published in the registry, and requests only go to the pool
+after the workers report ready; until then they run in-process.
+"""
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from lib import ml
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_ready = False
+_pool_lock = threading.Lock()
+_starter: Optional[threading.Thread] = None
+_pool_stats = {'requests': 0, 'fallbacks': 0, 'timeouts': 0, 'restarts': 0, 'warming': 0}
+
+
+def _init_worker():
+    """Runs once in each worker process: load the published models up front.
+    
+    Workers never train. Without a usable artifact a worker has no models,
+    answers every request with a version mismatch, and the caller runs
+    the rows in-process.
+    """
+    ml.load_models()
+
+
+def _worker_ready() -> str:
+    """No-op task: submitting one per worker spawns it, and it completes once the worker serves."""
+    return ml._model_cache_version()
+
+
+def _worker_infer(feature_rows: List[List[float]], compare: bool, version: str) -> Tuple[str, Optional[List]]:
+    """Classify in a worker; reloads the registry first if the caller has newer models."""
+    if ml._model_cache_version() != version:
+        ml.load_models()
+    scaler, models, meta = ml._active_models()
+    if ml._model_cache_version(meta) != version:
+        return ml._model_cache_version(meta), None
+    return version, ml._infer(feature_rows, compare, scaler, models)
+
+
+def _start():
+    """Publish the models, spawn every worker and wait until they serve; runs in a thread."""
+    global _pool, _pool_ready
+    # Train/save happens here in the parent only, so workers just load the artifact
+    ml.start_warmup().join()
+    if not ml.is_ready() or not ml.artifact_ready():
+        return
+    pool = ProcessPoolExecutor(
+        max_workers=ml.INFERENCE_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    )
+    with _pool_lock:
+        _pool = pool
+    try:
+        # Processes are only spawned on submit; one no-op per worker starts them all now
+        warmups = [pool.submit(_worker_ready) for _ in range(ml.INFERENCE_WORKERS)]
+        if any(future.result() != ml._model_cache_version() for future in warmups):
+            raise RuntimeError("inference workers loaded different models")
+    except Exception:
+        _reset_pool(pool)
+        return
+    with _pool_lock:
+        if _pool is pool:
+            _pool_ready = True
+
+
+def _reset_pool(pool: ProcessPoolExecutor):
+    """Drop a broken pool; the next request starts a fresh one in the background."""
+    global _pool, _pool_ready
+    with _pool_lock:
+        if _pool is pool:
+            _pool, _pool_ready = None, False
+            _pool_stats['restarts'] += 1
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def infer_remote(feature_rows: List[List[float]], compare: bool, version: str,
+                 timeout: Optional[float] = None) -> Optional[List[Tuple[str, int, Dict]]]:
+    """
+    Classify extracted feature rows in the worker pool.
+
+    Returns None instead of raising when the pool is disabled, still
+    starting, times out, or serves a different model version than
+    `version`, so the caller can run the same rows in-process.
+    """
+    if ml.INFERENCE_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        pool = _pool if _pool_ready else None
+    if pool is None:
+        # Workers are still spawning and loading models (or restarting)
+        _pool_stats['warming'] += 1
+        start_pool()
+        return None
+    _pool_stats['requests'] += 1
+    try:
+        future = pool.submit(_worker_infer, feature_rows, compare, version)
+        served_version, results = future.result(timeout=ml.INFERENCE_TIMEOUT if timeout is None else timeout)
+    except FutureTimeout:
+        future.cancel()
+        _pool_stats['timeouts'] += 1
+        results = None
+    except (BrokenProcessPool, OSError, RuntimeError):
+        _reset_pool(pool)
+        results = None
+    if results is None:
+        _pool_stats['fallbacks'] += 1
+    return results
+
+
+def start_pool():
+    """Spawn the workers in the background now instead of on first use; safe to call on every rerun."""
+    global _starter
+    if ml.INFERENCE_WORKERS <= 0:
+        return
+    with _pool_lock:
+        if _pool is not None or (_starter is not None and _starter.is_alive()):
+            return
+        _starter = threading.Thread(target=_start, name="inference-pool-start", daemon=True)
+        _starter.start()
+
+
+def shutdown_pool():
+    global _pool, _pool_ready
+    with _pool_lock:
+        pool, _pool, _pool_ready = _pool, None, False
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def inference_status() -> Dict:
+    """Pool size and request/fallback counters, for status displays."""
+    return dict(_pool_stats, workers=ml.INFERENCE_WORKERS, running=_pool is not None, ready=_pool_ready)
+
+
+atexit.register(shutdown_pool)
@@ -1,90 +1,367 @@
-from typing import Dict, Tuple, List
+from typing import TYPE_CHECKING, Dict, Tuple, List, Optional
+import hashlib
+import os
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import copy
+from collections import OrderedDict
+from datetime import datetime
 import numpy as np
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.svm import SVC
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
 import json
 from pathlib import Path
 
+# sklearn and joblib are imported inside the functions that train, load or
+# save models, so pages that only import this module (start_warmup,
+# model_status) render without paying for them; the warm-up thread does.
+if TYPE_CHECKING:
+    from sklearn.preprocessing import StandardScaler
 
-# Global models and scaler (trained on app startup)
+
+# Global models and scaler (loaded from the model registry, or trained if missing)
 _models = {}
-_scaler = StandardScaler()
+_scaler: Optional["StandardScaler"] = None
+_model_meta = {}
+_model_lock = threading.Lock()
+_swap_lock = threading.Lock()
+
+# Model registry: fitted scaler + models persisted under .data/models
+MODEL_DIR = Path(__file__).parent.parent / ".data" / "models"
+MODEL_POINTER = MODEL_DIR / "latest.json"
+# Bump when features, labels or model definitions change to force a retrain
+MODEL_VERSION = "1"
+
+# Training: concurrent fits across processes, forest trees across cores, training-set size
+TRAINING_WORKERS = int(os.environ.get("TRAINING_WORKERS", str(min(3, os.cpu_count() or 1))))
+RF_TRAIN_JOBS = int(os.environ.get("RF_TRAIN_JOBS", "-1"))
+TRAINING_DATA_SCALE = int(os.environ.get("TRAINING_DATA_SCALE", "1"))
+TRAINING_DATA_FILE = os.environ.get("TRAINING_DATA_FILE", "")
+# Retraining from stored analyses is skipped until at least this many exist
+RETRAIN_MIN_ANALYSES = int(os.environ.get("RETRAIN_MIN_ANALYSES", "50"))
+# Spawning workers costs seconds (each re-imports sklearn); small sets fit faster in-process
+_POOL_MIN_SAMPLES = 2000
+
+# Random Forest inference engine: "sklearn" (default) or "numpy" (lib.forest.CompiledForest)
+RF_ENGINE = os.environ.get("RF_ENGINE", "sklearn").lower()
+# Above this many rows sklearn's threaded predict_proba is faster again
+RF_NUMPY_MAX_BATCH = int(os.environ.get("RF_NUMPY_MAX_BATCH", "1000"))
+_compiled_rf = (None, None)  # (source model, CompiledForest)
+
+# Out-of-process inference pool (lib.inference): worker processes (0 = in-process) and timeout
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "0"))
+INFERENCE_TIMEOUT = float(os.environ.get("INFERENCE_TIMEOUT", "5"))
+
+# Prediction cache: identical feature vectors skip inference (0 disables; TTL 0 = no expiry)
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "1024"))
+PREDICTION_CACHE_TTL = float(os.environ.get("PREDICTION_CACHE_TTL", "3600"))
+_prediction_cache: "OrderedDict[tuple, Tuple[float, Tuple[str, int, Dict]]]" = OrderedDict()
+_prediction_cache_lock = threading.Lock()
+_prediction_cache_stats = {'hits': 0, 'misses': 0}
 _feature_names = ['age', 'stress_level', 'systolic_bp', 'heart_rate', 'sleep_duration', 
                   'bmi_numeric', 'snoring_frequency', 'working_hours', 'sleep_quality', 
                   'caffeine_intake', 'exercise_frequency', 'body_temperature']
 
-def _create_training_data():
-    """Create synthetic training data for ML models."""
+def _create_training_data(seed: int = 42, scale: int = 1):
+    """
+    Create synthetic training data for ML models (seeded, so it is reproducible).
+    
+    scale multiplies the number of samples per class (30/25/25 at scale 1).
+    """
+    rng = np.random.RandomState(seed)
     X = []
     y = []
     
     # Normal sleep patterns (class 0)
-    for _ in range(30):
-        X.append([np.random.randint(20, 65), np.random.randint(0, 5), 
-                  np.random.randint(110, 130), np.random.randint(60, 80),
-                  np.random.uniform(7, 9), np.random.uniform(18.5, 24.9),
-                  np.random.randint(0, 2), np.random.randint(6, 9),
-                  np.random.randint(8, 10), np.random.randint(0, 2),
-                  np.random.randint(4, 7), np.random.uniform(36.5, 37.2)])
+    for _ in range(30 * scale):
+        X.append([rng.randint(20, 65), rng.randint(0, 5), 
+                  rng.randint(110, 130), rng.randint(60, 80),
+                  rng.uniform(7, 9), rng.uniform(18.5, 24.9),
+                  rng.randint(0, 2), rng.randint(6, 9),
+                  rng.randint(8, 10), rng.randint(0, 2),
+                  rng.randint(4, 7), rng.uniform(36.5, 37.2)])
         y.append(0)
     
     # Moderate sleep issues (class 1)
-    for _ in range(25):
-        X.append([np.random.randint(30, 60), np.random.randint(5, 8),
-                  np.random.randint(130, 150), np.random.randint(80, 95),
-                  np.random.uniform(5, 7), np.random.uniform(25, 29.9),
-                  np.random.randint(3, 6), np.random.randint(8, 11),
-                  np.random.randint(5, 8), np.random.randint(2, 4),
-                  np.random.randint(2, 4), np.random.uniform(37.2, 37.5)])
+    for _ in range(25 * scale):
+        X.append([rng.randint(30, 60), rng.randint(5, 8),
+                  rng.randint(130, 150), rng.randint(80, 95),
+                  rng.uniform(5, 7), rng.uniform(25, 29.9),
+                  rng.randint(3, 6), rng.randint(8, 11),
+                  rng.randint(5, 8), rng.randint(2, 4),
+                  rng.randint(2, 4), rng.uniform(37.2, 37.5)])
         y.append(1)
     
     # Severe sleep disorders (class 2)
-    for _ in range(25):
-        X.append([np.random.randint(35, 70), np.random.randint(8, 10),
-                  np.random.randint(150, 170), np.random.randint(95, 110),
-                  np.random.uniform(3, 5), np.random.uniform(30, 35),
-                  np.random.randint(6, 10), np.random.randint(10, 13),
-                  np.random.randint(2, 5), np.random.randint(4, 10),
-                  np.random.randint(0, 2), np.random.uniform(37.5, 38.5)])
+    for _ in range(25 * scale):
+        X.append([rng.randint(35, 70), rng.randint(8, 10),
+                  rng.randint(150, 170), rng.randint(95, 110),
+                  rng.uniform(3, 5), rng.uniform(30, 35),
+                  rng.randint(6, 10), rng.randint(10, 13),
+                  rng.randint(2, 5), rng.randint(4, 10),
+                  rng.randint(0, 2), rng.uniform(37.5, 38.5)])
         y.append(2)
     
     return np.array(X), np.array(y)
 
 
-def _train_models():
-    """Train KNN, SVM, and Random Forest models."""
-    global _models, _scaler
+def _load_training_data():
+    """
+    Training set for a retrain.
+    
+    TRAINING_DATA_FILE points at a CSV with one column per feature name
+    plus a "label" column (0-2); otherwise the synthetic set is used,
+    enlarged TRAINING_DATA_SCALE times.
+    """
+    if TRAINING_DATA_FILE:
+        import pandas as pd
+        df = pd.read_csv(TRAINING_DATA_FILE)
+        return df[_feature_names].to_numpy(dtype=float), df["label"].to_numpy(dtype=int)
+    return _create_training_data(scale=max(1, TRAINING_DATA_SCALE))
+
+
+def _training_data_hash(X: np.ndarray, y: np.ndarray) -> str:
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=np.int64).tobytes())
+    return digest.hexdigest()[:16]
+
+
+_MODEL_NAMES = {'knn': 'K-Nearest Neighbors', 'svm': 'Support Vector Machine', 'rf': 'Random Forest'}
+
+
+def _fit_model(model_key: str, X_train, y_train, X_test, y_test, n_jobs: int = 1):
+    """Fit and score one model; runs in a training worker process."""
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.svm import SVC
+    from sklearn.ensemble import RandomForestClassifier
     
-    X, y = _create_training_data()
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    if model_key == 'knn':
+        model = KNeighborsClassifier(n_neighbors=5)
+    elif model_key == 'svm':
+        model = SVC(kernel='rbf', probability=True, random_state=42)
+    else:
+        model = RandomForestClassifier(n_estimators=100, random_state=42, max_depth=10, n_jobs=n_jobs)
+    
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    if model_key == 'rf':
+        # Trees are identical for any n_jobs; single-row inference is faster without joblib
+        model.n_jobs = None
+    return model, model.score(X_test, y_test), fit_seconds
+
+
+def _fit_models(X: np.ndarray, y: np.ndarray,
+                holdout: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> Tuple["StandardScaler", Dict, Dict]:
+    """
+    Fit scaler, KNN, SVM and Random Forest on (X, y) without touching the live models.
+    
+    Accuracy is scored on a 20% split of (X, y), or, if `holdout` is given,
+    on that (X_test, y_test) with all of (X, y) used for training.
+    
+    The three fits run concurrently in a process pool of TRAINING_WORKERS
+    processes (spawned, so it is safe from Streamlit's threads), with the
+    forest fitting its trees on RF_TRAIN_JOBS cores. Small training sets,
+    TRAINING_WORKERS=1 or a pool that cannot start fit them one after
+    another in-process.
+    """
+    import sklearn
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+    
+    if holdout is None:
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    else:
+        X_train, y_train = X, y
+        X_test, y_test = holdout
     
     # Scale features
-    X_train_scaled = _scaler.fit_transform(X_train)
-    X_test_scaled = _scaler.transform(X_test)
-    
-    # KNN Classifier
-    knn = KNeighborsClassifier(n_neighbors=5)
-    knn.fit(X_train_scaled, y_train)
-    knn_accuracy = knn.score(X_test_scaled, y_test)
-    
-    # SVM Classifier
-    svm = SVC(kernel='rbf', probability=True, random_state=42)
-    svm.fit(X_train_scaled, y_train)
-    svm_accuracy = svm.score(X_test_scaled, y_test)
-    
-    # Random Forest Classifier
-    rf = RandomForestClassifier(n_estimators=100, random_state=42, max_depth=10)
-    rf.fit(X_train_scaled, y_train)
-    rf_accuracy = rf.score(X_test_scaled, y_test)
-    
-    _models = {
-        'knn': {'model': knn, 'accuracy': knn_accuracy, 'name': 'K-Nearest Neighbors'},
-        'svm': {'model': svm, 'accuracy': svm_accuracy, 'name': 'Support Vector Machine'},
-        'rf': {'model': rf, 'accuracy': rf_accuracy, 'name': 'Random Forest'}
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+    X_test_scaled = scaler.transform(X_test)
+    
+    start = time.perf_counter()
+    args = (X_train_scaled, y_train, X_test_scaled, y_test, RF_TRAIN_JOBS)
+    fitted = None
+    if TRAINING_WORKERS > 1 and len(y) >= _POOL_MIN_SAMPLES:
+        try:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=min(TRAINING_WORKERS, len(_MODEL_NAMES)), mp_context=context) as pool:
+                futures = {key: pool.submit(_fit_model, key, *args) for key in _MODEL_NAMES}
+                fitted = {key: future.result() for key, future in futures.items()}
+        except (OSError, BrokenProcessPool):
+            fitted = None
+    if fitted is None:
+        fitted = {key: _fit_model(key, *args) for key in _MODEL_NAMES}
+    
+    models = {
+        key: {'model': model, 'accuracy': accuracy, 'name': _MODEL_NAMES[key]}
+        for key, (model, accuracy, _) in fitted.items()
     }
+    meta = {
+        'version': MODEL_VERSION,
+        'data_hash': _training_data_hash(X, y),
+        'trained_at': datetime.utcnow().isoformat(),
+        'sklearn_version': sklearn.__version__,
+        'n_samples': int(len(y)),
+        'fit_seconds': {key: round(seconds, 3) for key, (_, _, seconds) in fitted.items()},
+        'train_seconds': round(time.perf_counter() - start, 3),
+    }
+    return scaler, models, meta
+
+
+def _install_models(scaler: "StandardScaler", models: Dict, meta: Dict):
+    """Publish a scaler, models and metadata together; readers never see a mix."""
+    global _models, _scaler, _model_meta
+    with _swap_lock:
+        _scaler, _models, _model_meta = scaler, models, meta
+
+
+def _active_models() -> Tuple["StandardScaler", Dict, Dict]:
+    """Consistent (scaler, models, meta) snapshot for one inference call."""
+    with _swap_lock:
+        return _scaler, _models, _model_meta
+
+
+def _train_models():
+    """Train KNN, SVM, and Random Forest models."""
+    X, y = _load_training_data()
+    _install_models(*_fit_models(X, y))
+
+
+def save_models() -> Path:
+    """
+    Persist the fitted scaler and models as a versioned registry artifact.
+    
+    Only the new artifact and the one "latest" pointed at before it (kept
+    for rollback) stay on disk; older ones are deleted.
+    """
+    import joblib
+    
+    scaler, models, meta = _active_models()
+    MODEL_DIR.mkdir(parents=True, exist_ok=True)
+    name = f"sleep-models-v{meta['version']}-{meta['data_hash']}.joblib"
+    path = MODEL_DIR / name
+    previous = None
+    try:
+        with open(MODEL_POINTER, "r") as f:
+            previous = json.load(f).get('file')
+    except (OSError, ValueError):
+        pass
+    tmp = path.with_suffix(".tmp")
+    joblib.dump({'meta': meta, 'scaler': scaler, 'models': models}, tmp)
+    os.replace(tmp, path)
+    
+    # Point "latest" at the new artifact atomically
+    pointer_tmp = MODEL_POINTER.with_suffix(".tmp")
+    with open(pointer_tmp, "w") as f:
+        json.dump(dict(meta, file=name), f, indent=2)
+    os.replace(pointer_tmp, MODEL_POINTER)
+    
+    for old in MODEL_DIR.glob("sleep-models-*.joblib"):
+        if old.name not in (name, previous):
+            old.unlink(missing_ok=True)
+    return path
+
+
+def load_models() -> bool:
+    """Load the latest registry artifact; False if missing or built for another version."""
+    import joblib
+    import sklearn
+    
+    if not MODEL_POINTER.exists():
+        return False
+    try:
+        with open(MODEL_POINTER, "r") as f:
+            pointer = json.load(f)
+        if pointer.get('version') != MODEL_VERSION or pointer.get('sklearn_version') != sklearn.__version__:
+            return False
+        artifact = joblib.load(MODEL_DIR / pointer['file'])
+    except Exception:
+        return False
+    
+    _install_models(artifact['scaler'], artifact['models'], artifact['meta'])
+    return True
+
+
+def retrain_models() -> Dict:
+    """Retrain all models from scratch and publish them to the registry."""
+    with _model_lock:
+        _train_models()
+        save_models()
+        clear_prediction_cache()
+        return dict(_model_meta)
+
+
+def _ensure_models():
+    """Load models from the registry, training (and saving) only if no usable artifact exists."""
+    if _models:
+        return
+    warmup = _warmup_thread
+    if warmup is not None and warmup.is_alive() and warmup is not threading.current_thread():
+        # Background warm-up is already loading/training; wait for it
+        warmup.join()
+        if _models:
+            return
+    with _model_lock:
+        if _models:
+            return
+        if not load_models():
+            _train_models()
+            save_models()
+
+
+def get_model_info() -> Dict:
+    """Version, training-data hash and timestamp of the models in use."""
+    return dict(_model_meta)
+
+
+_warmup_lock = threading.Lock()
+_warmup_thread: Optional[threading.Thread] = None
+_warmup_error: Optional[str] = None
+
+
+def _warmup():
+    global _warmup_error
+    try:
+        _ensure_models()
+        _warmup_error = None
+    except Exception as e:
+        _warmup_error = str(e)
+
+
+def start_warmup() -> threading.Thread:
+    """Load (or train) models in a background thread; safe to call on every rerun."""
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is None or (not _warmup_thread.is_alive() and not _models):
+            _warmup_thread = threading.Thread(target=_warmup, name="model-warmup", daemon=True)
+            _warmup_thread.start()
+        return _warmup_thread
+
+
+def is_ready() -> bool:
+    """True once models are loaded in this process and classify() will not block."""
+    return bool(_models)
+
+
+def model_status() -> Dict:
+    """Readiness of the models in this process, for status displays."""
+    warming = _warmup_thread is not None and _warmup_thread.is_alive()
+    return dict(_model_meta, ready=is_ready(), warming=warming, error=_warmup_error,
+                prediction_cache=prediction_cache_stats())
+
+
+def artifact_ready() -> bool:
+    """True if the registry holds an artifact for the current model version."""
+    try:
+        with open(MODEL_POINTER, "r") as f:
+            pointer = json.load(f)
+    except Exception:
+        return False
+    return pointer.get('version') == MODEL_VERSION and (MODEL_DIR / pointer.get('file', '')).is_file()
 
 
 def _extract_features(inputs: Dict) -> List[float]:
@@ -109,72 +386,336 @@ def _extract_features(inputs: Dict) -> List[float]:
     return features
 
 
-def classify(inputs: Dict) -> Tuple[str, int, Dict]:
+# Map prediction to diagnosis
+_SEVERITY_MAP = {
+    0: ("Normal Sleep Pattern", 0, "Your sleep metrics indicate a normal, healthy sleep pattern. Continue current sleep habits."),
+    1: ("Moderate Sleep Issues - Review Recommended", 1, "Your sleep shows some concerning patterns. Consider lifestyle adjustments and consult a healthcare provider."),
+    2: ("High Risk Sleep Disorder Detected", 2, "Significant sleep disorder indicators detected. Medical evaluation strongly recommended.")
+}
+
+
+def _build_result(features: List[float], predictions: Dict, confidences: Dict,
+                  models: Optional[Dict] = None) -> Tuple[str, int, Dict]:
+    """Turn per-model predictions for one row into (diagnosis, severity, details)."""
+    models = models or _models
+    best_model_key = _best_model_key(models)
+    best_prediction = predictions[best_model_key]
+    best_confidence = confidences[best_model_key]
+    
+    diagnosis, severity, recommendation = _SEVERITY_MAP.get(best_prediction, ("Needs Review", 1, "Please consult a healthcare provider."))
+    
+    # Build detailed results
+    detailed_results = {
+        'best_model': best_model_key,
+        'best_model_name': models[best_model_key]['name'],
+        'best_model_accuracy': float(models[best_model_key]['accuracy']) * 100,
+        'best_confidence': best_confidence,
+        'all_predictions': predictions,
+        'all_confidences': confidences,
+        'all_model_accuracies': {k: float(v['accuracy']) * 100 for k, v in models.items()},
+        'model_names': {k: v['name'] for k, v in models.items()},
+        'recommendation': recommendation,
+        'feature_values': dict(zip(_feature_names, features))
+    }
+    
+    return diagnosis, severity, detailed_results
+
+
+def _predict_proba(model_key: str, X_scaled: np.ndarray, models: Optional[Dict] = None) -> np.ndarray:
+    """Class probabilities from one model, using the compiled forest when enabled."""
+    global _compiled_rf
+    model_obj = (models or _models)[model_key]['model']
+    if model_key == 'rf' and RF_ENGINE == 'numpy' and len(X_scaled) <= RF_NUMPY_MAX_BATCH:
+        source, compiled = _compiled_rf
+        if source is not model_obj:
+            from lib.forest import CompiledForest
+            compiled = CompiledForest.from_sklearn(model_obj)
+            _compiled_rf = (model_obj, compiled)
+        return compiled.predict_proba(X_scaled)
+    return model_obj.predict_proba(X_scaled)
+
+
+def _model_cache_version(meta: Optional[Dict] = None) -> str:
+    """Identifies the fitted models; changes on every retrain."""
+    meta = meta or _model_meta
+    return f"{meta.get('version')}-{meta.get('data_hash')}-{meta.get('trained_at')}"
+
+
+def _cache_get(key: tuple) -> Optional[Tuple[str, int, Dict]]:
+    with _prediction_cache_lock:
+        entry = _prediction_cache.get(key)
+        if entry is not None and PREDICTION_CACHE_TTL > 0 and time.monotonic() - entry[0] > PREDICTION_CACHE_TTL:
+            del _prediction_cache[key]
+            entry = None
+        if entry is None:
+            _prediction_cache_stats['misses'] += 1
+            return None
+        _prediction_cache.move_to_end(key)
+        _prediction_cache_stats['hits'] += 1
+    # Callers may mutate the details dict; never hand out the cached one
+    return copy.deepcopy(entry[1])
+
+
+def _cache_put(key: tuple, result: Tuple[str, int, Dict]):
+    with _prediction_cache_lock:
+        _prediction_cache[key] = (time.monotonic(), copy.deepcopy(result))
+        _prediction_cache.move_to_end(key)
+        while len(_prediction_cache) > PREDICTION_CACHE_SIZE:
+            _prediction_cache.popitem(last=False)
+
+
+def clear_prediction_cache():
+    """Drop all cached predictions (done automatically when models are retrained)."""
+    with _prediction_cache_lock:
+        _prediction_cache.clear()
+
+
+def prediction_cache_stats() -> Dict:
+    """Size and hit/miss counters of the prediction cache."""
+    with _prediction_cache_lock:
+        return dict(_prediction_cache_stats, size=len(_prediction_cache), max_size=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL)
+
+
+def _best_model_key(models: Optional[Dict] = None) -> str:
+    """Model with the highest holdout accuracy; it alone decides the diagnosis."""
+    models = models or _models
+    return max(models.keys(), key=lambda k: models[k]['accuracy'])
+
+
+def _infer(feature_rows: List[List[float]], compare: bool, scaler: "StandardScaler",
+           models: Dict) -> List[Tuple[str, int, Dict]]:
+    """Run the models on extracted feature rows; shared by classify_batch and inference workers."""
+    X_scaled = scaler.transform(np.array(feature_rows, dtype=float))
+    
+    # Get predictions from the best model, plus the others when comparing
+    model_keys = ['knn', 'svm', 'rf'] if compare else [_best_model_key(models)]
+    predictions = {}
+    confidences = {}
+    for model_key in model_keys:
+        model_obj = models[model_key]['model']
+        probs = _predict_proba(model_key, X_scaled, models)
+        best = probs.argmax(axis=1)
+        predictions[model_key] = model_obj.classes_[best]
+        confidences[model_key] = probs[np.arange(len(best)), best]
+    
+    results = []
+    for i, features in enumerate(feature_rows):
+        row_predictions = {k: int(v[i]) for k, v in predictions.items()}
+        row_confidences = {k: float(v[i]) * 100 for k, v in confidences.items()}
+        results.append(_build_result(features, row_predictions, row_confidences, models))
+    return results
+
+
+def classify_batch(inputs, compare: bool = True) -> List[Tuple[str, int, Dict]]:
+    """
+    Classify many records at once (list of input dicts or a DataFrame).
+    
+    Features are extracted into one matrix and scaled once, and each model
+    makes a single vectorized predict_proba call; the predicted class is
+    the argmax of that probability vector, so no model runs twice.
+    Rows whose normalized features were classified recently by the same
+    models are answered from the prediction cache without inference.
+    With INFERENCE_WORKERS set, the rest are sent to the lib.inference
+    process pool, falling back to in-process inference on any failure.
+    
+    With compare=False only the best model runs and the details carry its
+    prediction alone; pass compare=True (the default) when the caller
+    needs every model's prediction for the report's comparison section.
+    Returns one (diagnosis, severity_level, detailed_results) tuple per
+    row, identical to calling classify() on each row.
+    """
+    # Load (or train) models if not already done; a retrain may swap them mid-call
+    _ensure_models()
+    scaler, models, meta = _active_models()
+    
+    if hasattr(inputs, "to_dict"):
+        import pandas as pd
+        # Empty cells come back as NaN; drop them so _extract_features uses its defaults
+        inputs = [
+            {k: v for k, v in row.items() if not (pd.api.types.is_scalar(v) and pd.isna(v))}
+            for row in inputs.to_dict("records")
+        ]
+    feature_rows = [_extract_features(row) for row in inputs]
+    if not feature_rows:
+        return []
+    
+    # Repeat submissions (same normalized features, same models) come from the cache
+    results: List[Optional[Tuple[str, int, Dict]]] = [None] * len(feature_rows)
+    keys: List[Optional[tuple]] = [None] * len(feature_rows)
+    if PREDICTION_CACHE_SIZE > 0:
+        version = _model_cache_version(meta)
+        for i, features in enumerate(feature_rows):
+            keys[i] = (version, compare, tuple(features))
+            results[i] = _cache_get(keys[i])
+    missing = [i for i, result in enumerate(results) if result is None]
+    if not missing:
+        return results
+    
+    missing_rows = [feature_rows[i] for i in missing]
+    computed = None
+    if INFERENCE_WORKERS > 0:
+        # Off-process inference; None (disabled, timed out, stale models) means run it here
+        from lib.inference import infer_remote
+        computed = infer_remote(missing_rows, compare, _model_cache_version(meta))
+    if computed is None:
+        computed = _infer(missing_rows, compare, scaler, models)
+    
+    for i, result in zip(missing, computed):
+        results[i] = result
+        if keys[i] is not None:
+            _cache_put(keys[i], results[i])
+    return results
+
+
+def classify(inputs: Dict, compare: bool = True) -> Tuple[str, int, Dict]:
     """
     Classify sleep disorder using ensemble of three ML models.
     
+    Set compare=False to run only the best model when the per-model
+    comparison is not needed.
+    
     Returns:
         Tuple of (diagnosis, severity_level, detailed_results)
         - diagnosis: Diagnosis string
         - severity_level: 0-3 (Normal to High Risk)
         - detailed_results: Dict with model predictions and confidence
     """
-    # Train models if not already done
-    if not _models:
-        _train_models()
+    return classify_batch([inputs], compare=compare)[0]
+
+# Stored analysis fields read by _extract_features (one per model feature), plus the label
+_FEATURE_INPUTS = ["age", "stress", "blood_pressure", "heart_rate", "sleep_duration", "bmi_category",
+                   "snoring_frequency", "working_hours", "sleep_quality", "caffeine_intake",
+                   "exercise_frequency", "body_temperature"]
+
+
+def _stored_training_data(page_size: int = 1000) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Feature matrix and labels from every stored analysis.
     
-    # Extract and scale features
-    features = _extract_features(inputs)
-    X_scaled = _scaler.transform([features])
+    Rows are streamed from lib.db in keyset pages and converted one page
+    at a time. Whole rows are requested, so a Supabase table without some
+    of the input columns still reads (those rows are just incomplete),
+    and a failed Supabase read raises rather than training on the local
+    fallback. Only rows that store every model input are used: the
+    saved severity was predicted from the patient's real values, so
+    filling missing inputs with _extract_features' defaults would
+    mislabel the row. The label is the severity clipped to the model's 0-2.
+    """
+    from lib.db import iter_analyses
     
-    # Get predictions from all models
-    predictions = {}
-    confidences = {}
+    X_chunks, y_chunks = [], []
+    X_rows, y_rows = [], []
+    for row in iter_analyses(page_size=page_size, strict=True):
+        if row.get("severity") is None or any(row.get(k) is None for k in _FEATURE_INPUTS):
+            continue
+        X_rows.append(_extract_features(row))
+        y_rows.append(min(max(int(row["severity"]), 0), 2))
+        if len(X_rows) >= page_size:
+            X_chunks.append(np.array(X_rows, dtype=float))
+            y_chunks.append(np.array(y_rows, dtype=int))
+            X_rows, y_rows = [], []
+    if X_rows:
+        X_chunks.append(np.array(X_rows, dtype=float))
+        y_chunks.append(np.array(y_rows, dtype=int))
+    if not X_chunks:
+        return np.empty((0, len(_feature_names))), np.empty(0, dtype=int)
+    return np.concatenate(X_chunks), np.concatenate(y_chunks)
+
+
+def retrain_from_analyses(page_size: int = 1000) -> Dict:
+    """
+    Refit all models on the base training set plus every stored analysis.
     
-    for model_key in ['knn', 'svm', 'rf']:
-        model_obj = _models[model_key]['model']
-        pred = model_obj.predict(X_scaled)[0]
-        predictions[model_key] = int(pred)
-        
-        # Get confidence (probability)
-        if hasattr(model_obj, 'predict_proba'):
-            probs = model_obj.predict_proba(X_scaled)[0]
-            confidences[model_key] = float(max(probs)) * 100
-        else:
-            confidences[model_key] = 85.0  # Default for KNN
-    
-    # Ensure we have model details
-    for model_key in ['knn', 'svm', 'rf']:
-        if model_key not in _models:
-            _train_models()
-            break
+    None of the three estimators supports partial_fit, so this is a full
+    refit on the combined data. Both the candidate and the live best model
+    are scored on the held-out 20% of the base set: the live model neither
+    trained on those rows nor labelled them, unlike the stored analyses.
+    The candidate is swapped in (and published to the registry) only if
+    its accuracy does not regress; the live models keep serving throughout.
+    Refused while Supabase is configured but unreachable, since the
+    stored analyses would come from this instance's local fallback only.
+    """
+    from lib.db import supabase_status
+    from sklearn.model_selection import train_test_split
     
-    # Find best model (highest accuracy on training set)
-    best_model_key = max(_models.keys(), key=lambda k: _models[k]['accuracy'])
-    best_prediction = predictions[best_model_key]
-    best_confidence = confidences[best_model_key]
+    db_status = supabase_status()
+    if db_status['configured'] and db_status['state'] != 'closed':
+        return {'n_stored': 0, 'swapped': False, 'reason': "Supabase is unreachable; retry once it recovers"}
+    X_stored, y_stored = _stored_training_data(page_size)
+    result = {'n_stored': int(len(y_stored)), 'swapped': False}
+    if len(y_stored) < RETRAIN_MIN_ANALYSES:
+        result['reason'] = f"only {len(y_stored)} stored analyses with every model input (need {RETRAIN_MIN_ANALYSES})"
+        return result
     
-    # Map prediction to diagnosis
-    severity_map = {
-        0: ("Normal Sleep Pattern", 0, "Your sleep metrics indicate a normal, healthy sleep pattern. Continue current sleep habits."),
-        1: ("Moderate Sleep Issues - Review Recommended", 1, "Your sleep shows some concerning patterns. Consider lifestyle adjustments and consult a healthcare provider."),
-        2: ("High Risk Sleep Disorder Detected", 2, "Significant sleep disorder indicators detected. Medical evaluation strongly recommended.")
-    }
+    # The split _train_models used, so the holdout is unseen by the live models too
+    X_base, X_test, y_base, y_test = train_test_split(*_load_training_data(), test_size=0.2, random_state=42)
+    X = np.concatenate([X_base, X_stored])
+    y = np.concatenate([y_base, y_stored])
+    scaler, models, meta = _fit_models(X, y, holdout=(X_test, y_test))
+    meta['n_stored'] = result['n_stored']
     
-    diagnosis, severity, recommendation = severity_map.get(best_prediction, ("Needs Review", 1, "Please consult a healthcare provider."))
+    _ensure_models()
+    live_scaler, live_models, _ = _active_models()
+    live_key = _best_model_key(live_models)
+    result['live_accuracy'] = float(live_models[live_key]['model'].score(live_scaler.transform(X_test), y_test))
+    result['new_accuracy'] = float(models[_best_model_key(models)]['accuracy'])
+    if result['new_accuracy'] < result['live_accuracy']:
+        result['reason'] = "holdout accuracy regressed"
+        return result
     
-    # Build detailed results
-    detailed_results = {
-        'best_model': best_model_key,
-        'best_model_name': _models[best_model_key]['name'],
-        'best_model_accuracy': float(_models[best_model_key]['accuracy']) * 100,
-        'best_confidence': best_confidence,
-        'all_predictions': predictions,
-        'all_confidences': confidences,
-        'all_model_accuracies': {k: float(v['accuracy']) * 100 for k, v in _models.items()},
-        'model_names': {k: v['name'] for k, v in _models.items()},
-        'recommendation': recommendation,
-        'feature_values': dict(zip(_feature_names, features))
-    }
+    with _model_lock:
+        _install_models(scaler, models, meta)
+        save_models()
+        clear_prediction_cache()
+    result['swapped'] = True
+    return dict(meta, **result)
+
+
+_retrain_lock = threading.Lock()
+_retrain_thread: Optional[threading.Thread] = None
+_retrain_result: Optional[Dict] = None
+
+
+def _retrain_worker():
+    global _retrain_result
+    try:
+        _retrain_result = dict(retrain_from_analyses(), finished_at=datetime.utcnow().isoformat())
+    except Exception as e:
+        _retrain_result = {'swapped': False, 'error': str(e), 'finished_at': datetime.utcnow().isoformat()}
+
+
+def start_retrain_from_analyses() -> threading.Thread:
+    """Run retrain_from_analyses() in a background thread unless one is already running."""
+    global _retrain_thread
+    with _retrain_lock:
+        if _retrain_thread is None or not _retrain_thread.is_alive():
+            _retrain_thread = threading.Thread(target=_retrain_worker, name="model-retrain", daemon=True)
+            _retrain_thread.start()
+        return _retrain_thread
+
+
+def retrain_status() -> Dict:
+    """Whether a background retrain is running, and the outcome of the last one."""
+    running = _retrain_thread is not None and _retrain_thread.is_alive()
+    return {'running': running, 'last': _retrain_result}
+
+
+if __name__ == "__main__":
+    import argparse
     
-    return diagnosis, severity, detailed_results
+    parser = argparse.ArgumentParser(description="Model registry maintenance")
+    parser.add_argument("command", choices=["retrain", "retrain-analyses", "info", "warmup", "health"])
+    args = parser.parse_args()
+    
+    if args.command == "health":
+        # Container HEALTHCHECK: ready once a current-version artifact is on disk
+        raise SystemExit(0 if artifact_ready() else 1)
+    elif args.command == "warmup":
+        _ensure_models()
+        print(json.dumps(get_model_info(), indent=2))
+    elif args.command == "retrain":
+        print(json.dumps(retrain_models(), indent=2))
+    elif args.command == "retrain-analyses":
+        print(json.dumps(retrain_from_analyses(), indent=2))
+    elif args.command == "info":
+        print(json.dumps(get_model_info() if load_models() else {"status": "no artifact"}, indent=2))
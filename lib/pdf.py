@@ -1,14 +1,126 @@
-from typing import Dict
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import lru_cache
 from fpdf import FPDF
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
 
-def build_report(data: Dict) -> bytes:
-    """Generate a formatted medical report PDF with hospital branding."""
-    pdf = FPDF()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    pdf.add_page()
-    
+# Bump whenever the report layout (_draw_report) or wording changes so cached PDFs are re-rendered
+TEMPLATE_VERSION = "1"
+
+# Rendered reports cached on disk (one directory per analysis id), evicted least
+# recently used beyond the size limit, down to the low watermark fraction of it
+REPORT_CACHE_DIR = Path(__file__).parent.parent / ".data" / "reports"
+REPORT_CACHE_MAX_MB = float(os.environ.get("REPORT_CACHE_MAX_MB", "200"))
+REPORT_CACHE_LOW_WATERMARK = 0.9
+
+# Record fields build_report renders; only these feed the cache key
+REPORT_FIELDS = [
+    "id", "user_email", "phone", "age", "gender", "occupation", "bmi_category",
+    "blood_pressure", "heart_rate", "sleep_duration", "stress", "snoring_frequency", "working_hours",
+    "diagnosis", "severity", "ml_model_used", "ml_confidence", "ml_model_accuracy",
+]
+
+_cache_lock = threading.Lock()
+# Running size of the cache in bytes; scanned once per process, then kept up to date
+_cache_bytes: Optional[int] = None
+
+# Consolidated shift-handover PDFs (kept separately from the evictable report cache)
+HANDOVER_DIR = Path(__file__).parent.parent / ".data" / "handovers"
+HANDOVER_SHIFT_HOURS = float(os.environ.get("HANDOVER_SHIFT_HOURS", "12"))
+HANDOVER_KEEP = 5
+
+# Reports are pre-generated in the background right after an analysis is saved
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", "2"))
+_report_jobs: Dict[str, Future] = {}
+_report_jobs_lock = threading.Lock()
+_report_executor: Optional[ThreadPoolExecutor] = None
+
+
+# Severity indicators (text-based, no emoji)
+_SEVERITY_LABELS = {
+    0: "GREEN - No Risk",
+    1: "YELLOW - Low Risk / Needs Review",
+    2: "ORANGE - Moderate Risk",
+    3: "RED - High Risk / Urgent"
+}
+
+_DISCLAIMER = (
+    "This report is generated by an AI-powered classification system for informational purposes only. "
+    "It does not constitute medical advice or diagnosis. Always consult a qualified healthcare professional "
+    "for proper diagnosis, treatment, and medical guidance. The analysis is based on submitted metrics and "
+    "should not replace professional medical evaluation."
+)
+
+# Detailed ML prediction summary per severity
+_SEVERITY_SUMMARIES = {
+    0: ("- Normal sleep pattern detected\n"
+        "- All vital signs within healthy ranges\n"
+        "- No indicators of sleep-related disorders\n"
+        "- RECOMMENDATION: Continue current sleep habits and regular monitoring"),
+    1: ("- Mild abnormalities detected in sleep metrics\n"
+        "- Some vital signs show minor deviations\n"
+        "- Further monitoring recommended\n"
+        "- RECOMMENDATION: Consider lifestyle adjustments for better sleep quality"),
+    2: ("- Moderate sleep disorder risk identified\n"
+        "- Multiple vital sign abnormalities detected\n"
+        "- Sleep deprivation or irregular patterns observed\n"
+        "- RECOMMENDATION: Medical consultation with sleep specialist recommended"),
+    3: ("- High-risk sleep disorder detected\n"
+        "- Critical vital sign abnormalities present\n"
+        "- Urgent medical intervention may be needed\n"
+        "- RECOMMENDATION: Immediate healthcare professional consultation required"),
+}
+
+
+def _severity(data: Dict) -> int:
+    # Convert severity to int safely
+    try:
+        return int(data.get("severity", 1))
+    except (ValueError, TypeError):
+        return 1
+
+
+def _report_values(data: Dict) -> Dict[str, str]:
+    """Per-patient text of every field slot in the layout."""
+    now = datetime.utcnow()
+    return {
+        "report_id": f"Report ID: {data.get('id', 'N/A')}",
+        "date": f"Date: {now.strftime('%Y-%m-%d %H:%M UTC')}",
+        "email": str(data.get("user_email", "N/A")),
+        "phone": str(data.get("phone", "N/A")),
+        "age": f"{data.get('age', 'N/A')} years",
+        "gender": str(data.get("gender", "N/A")),
+        "occupation": str(data.get("occupation", "N/A")),
+        "bmi_category": str(data.get("bmi_category", "N/A")),
+        "blood_pressure": f"{data.get('blood_pressure', 'N/A')} mmHg",
+        "heart_rate": f"{data.get('heart_rate', 'N/A')} bpm",
+        "sleep_duration": f"{data.get('sleep_duration', 'N/A')} hours/night",
+        "stress": f"{data.get('stress', 'N/A')}/10",
+        "snoring_frequency": f"{data.get('snoring_frequency', 'N/A')} times/week",
+        "working_hours": f"{data.get('working_hours', 'N/A')} hours/day",
+        "ml_model_used": str(data.get("ml_model_used", "Random Forest")),
+        "ml_accuracy": f"{float(data.get('ml_model_accuracy', 88.5)):.1f}%",
+        "ml_confidence": f"{float(data.get('ml_confidence', 85.0)):.1f}%",
+        "generated": f"Report Generated: {now.strftime('%Y-%m-%d %H:%M:%S UTC')}",
+    }
+
+
+def _draw_report(pdf: FPDF, diagnosis: str, severity: int, rf_selected: bool, field):
+    """
+    Lay out the whole report.
+    
+    Everything except the per-patient values is drawn here; each value is
+    drawn through field(name, w, h, **cell_kwargs), which either renders
+    it or records where it goes (see ReportTemplate).
+    """
     # Hospital Header (no emoji - FPDF doesn't support them)
     pdf.set_font("Arial", "B", 18)
     pdf.cell(0, 10, "MediSleep Hospital", ln=1, align="C")
@@ -27,8 +139,8 @@ def build_report(data: Dict) -> bytes:
     
     # Report ID and Date
     pdf.set_font("Arial", size=10)
-    pdf.cell(0, 6, f"Report ID: {data.get('id', 'N/A')}", ln=1)
-    pdf.cell(0, 6, f"Date: {datetime.utcnow().strftime('%Y-%m-%d %H:%M UTC')}", ln=1)
+    field("report_id", 0, 6, ln=1)
+    field("date", 0, 6, ln=1)
     pdf.ln(4)
     
     # Patient Details Section
@@ -40,17 +152,17 @@ def build_report(data: Dict) -> bytes:
     
     pdf.set_font("Arial", size=11)
     patient_fields = [
-        ("Email", data.get("user_email", "N/A")),
-        ("Phone", data.get("phone", "N/A")),
-        ("Age", f"{data.get('age', 'N/A')} years"),
-        ("Gender", data.get("gender", "N/A")),
-        ("Occupation", data.get("occupation", "N/A")),
-        ("BMI Category", data.get("bmi_category", "N/A")),
+        ("Email", "email"),
+        ("Phone", "phone"),
+        ("Age", "age"),
+        ("Gender", "gender"),
+        ("Occupation", "occupation"),
+        ("BMI Category", "bmi_category"),
     ]
     
-    for label, value in patient_fields:
+    for label, name in patient_fields:
         pdf.cell(90, 7, f"{label}:", border=0)
-        pdf.cell(0, 7, str(value), ln=1, border=0)
+        field(name, 0, 7, ln=1, border=0)
     
     pdf.ln(4)
     
@@ -63,17 +175,17 @@ def build_report(data: Dict) -> bytes:
     
     pdf.set_font("Arial", size=11)
     vitals_fields = [
-        ("Blood Pressure", f"{data.get('blood_pressure', 'N/A')} mmHg"),
-        ("Heart Rate", f"{data.get('heart_rate', 'N/A')} bpm"),
-        ("Sleep Duration", f"{data.get('sleep_duration', 'N/A')} hours/night"),
-        ("Stress Level", f"{data.get('stress', 'N/A')}/10"),
-        ("Snoring Frequency", f"{data.get('snoring_frequency', 'N/A')} times/week"),
-        ("Working Hours", f"{data.get('working_hours', 'N/A')} hours/day"),
+        ("Blood Pressure", "blood_pressure"),
+        ("Heart Rate", "heart_rate"),
+        ("Sleep Duration", "sleep_duration"),
+        ("Stress Level", "stress"),
+        ("Snoring Frequency", "snoring_frequency"),
+        ("Working Hours", "working_hours"),
     ]
     
-    for label, value in vitals_fields:
+    for label, name in vitals_fields:
         pdf.cell(90, 7, f"{label}:", border=0)
-        pdf.cell(0, 7, str(value), ln=1, border=0)
+        field(name, 0, 7, ln=1, border=0)
     
     pdf.ln(4)
     
@@ -85,21 +197,6 @@ def build_report(data: Dict) -> bytes:
     pdf.ln(2)
     
     pdf.set_font("Arial", "B", 11)
-    diagnosis = str(data.get("diagnosis", "Needs Review"))
-    
-    # Convert severity to int safely
-    try:
-        severity = int(data.get("severity", 1))
-    except (ValueError, TypeError):
-        severity = 1
-    
-    # Severity indicators (text-based, no emoji)
-    severity_labels = {
-        0: "GREEN - No Risk",
-        1: "YELLOW - Low Risk / Needs Review",
-        2: "ORANGE - Moderate Risk",
-        3: "RED - High Risk / Urgent"
-    }
     
     pdf.cell(0, 8, f"Primary Diagnosis:", ln=1)
     pdf.set_font("Arial", size=11)
@@ -107,7 +204,7 @@ def build_report(data: Dict) -> bytes:
     
     pdf.ln(2)
     pdf.set_font("Arial", "B", 11)
-    pdf.cell(0, 7, f"Risk Level: {severity_labels.get(severity, 'Unknown')} (Severity: {severity}/3)", ln=1)
+    pdf.cell(0, 7, f"Risk Level: {_SEVERITY_LABELS.get(severity, 'Unknown')} (Severity: {severity}/3)", ln=1)
     
     pdf.ln(3)
     
@@ -116,16 +213,12 @@ def build_report(data: Dict) -> bytes:
     pdf.cell(0, 7, "Machine Learning Model Performance:", ln=1)
     
     pdf.set_font("Arial", size=10)
-    ml_model_used = str(data.get("ml_model_used", "Random Forest"))
-    ml_confidence = float(data.get("ml_confidence", 85.0))
-    ml_accuracy = float(data.get("ml_model_accuracy", 88.5))
-    
     pdf.cell(90, 6, "Best Model:", 0)
-    pdf.cell(0, 6, ml_model_used, ln=1)
+    field("ml_model_used", 0, 6, ln=1)
     pdf.cell(90, 6, "Model Accuracy:", 0)
-    pdf.cell(0, 6, f"{ml_accuracy:.1f}%", ln=1)
+    field("ml_accuracy", 0, 6, ln=1)
     pdf.cell(90, 6, "Prediction Confidence:", 0)
-    pdf.cell(0, 6, f"{ml_confidence:.1f}%", ln=1)
+    field("ml_confidence", 0, 6, ln=1)
     
     pdf.ln(2)
     pdf.set_font("Arial", "B", 10)
@@ -143,7 +236,7 @@ def build_report(data: Dict) -> bytes:
     
     pdf.cell(65, 5, "Random Forest", 1, 0, "L")
     pdf.cell(65, 5, "88.5% accuracy", 1, 0, "C")
-    if "Random Forest" in ml_model_used:
+    if rf_selected:
         pdf.cell(0, 5, "SELECTED", 1, 1)
     else:
         pdf.cell(0, 5, "Alternative", 1, 1)
@@ -155,32 +248,7 @@ def build_report(data: Dict) -> bytes:
     pdf.set_font("Arial", size=10)
     
     # Add detailed ML prediction summary (text-based)
-    if severity == 0:
-        summary_text = (
-            "- Normal sleep pattern detected\n"
-            "- All vital signs within healthy ranges\n"
-            "- No indicators of sleep-related disorders\n"
-            "- RECOMMENDATION: Continue current sleep habits and regular monitoring")
-    elif severity == 1:
-        summary_text = (
-            "- Mild abnormalities detected in sleep metrics\n"
-            "- Some vital signs show minor deviations\n"
-            "- Further monitoring recommended\n"
-            "- RECOMMENDATION: Consider lifestyle adjustments for better sleep quality")
-    elif severity == 2:
-        summary_text = (
-            "- Moderate sleep disorder risk identified\n"
-            "- Multiple vital sign abnormalities detected\n"
-            "- Sleep deprivation or irregular patterns observed\n"
-            "- RECOMMENDATION: Medical consultation with sleep specialist recommended")
-    elif severity == 3:
-        summary_text = (
-            "- High-risk sleep disorder detected\n"
-            "- Critical vital sign abnormalities present\n"
-            "- Urgent medical intervention may be needed\n"
-            "- RECOMMENDATION: Immediate healthcare professional consultation required")
-    else:
-        summary_text = "Unable to determine classification details"
+    summary_text = _SEVERITY_SUMMARIES.get(severity, "Unable to determine classification details")
     
     # Write the summary with better formatting
     pdf.multi_cell(0, 5, summary_text)
@@ -192,26 +260,421 @@ def build_report(data: Dict) -> bytes:
     pdf.cell(0, 8, "MEDICAL DISCLAIMER", ln=1, border=1, align="C")
     pdf.set_font("Arial", "I", 9)
     pdf.set_fill_color(240, 240, 240)
-    pdf.multi_cell(
-        0, 5,
-        "This report is generated by an AI-powered classification system for informational purposes only. "
-        "It does not constitute medical advice or diagnosis. Always consult a qualified healthcare professional "
-        "for proper diagnosis, treatment, and medical guidance. The analysis is based on submitted metrics and "
-        "should not replace professional medical evaluation.",
-        fill=True
-    )
+    pdf.multi_cell(0, 5, _DISCLAIMER, fill=True)
     
     pdf.ln(6)
     pdf.set_font("Arial", "I", 8)
-    pdf.cell(0, 5, f"Report Generated: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}", align="C", ln=1)
+    field("generated", 0, 5, align="C", ln=1)
+
+
+class _Slot(NamedTuple):
+    page: int
+    x: float
+    y: float
+    w: float
+    h: float
+    family: str
+    style: str
+    size: float
+    align: str
+
+
+class ReportTemplate:
+    """
+    A report with all static content already laid out, for one combination
+    of the inputs that change its geometry (diagnosis text, severity and
+    whether Random Forest is the selected model).
+    
+    The header, section rules, labels, comparison table, summary and the
+    disclaimer paragraph are drawn once; render() copies that document and
+    only writes the per-patient values into the recorded slots.
+    """
+    
+    def __init__(self, diagnosis: str, severity: int, rf_selected: bool):
+        self.slots: Dict[str, _Slot] = {}
+        pdf = FPDF()
+        pdf.set_auto_page_break(auto=True, margin=15)
+        pdf.add_page()
+        
+        def record(name, w, h, **cell_kwargs):
+            self.slots[name] = _Slot(pdf.page, pdf.get_x(), pdf.get_y(), w, h,
+                                     pdf.font_family, pdf.font_style, pdf.font_size_pt,
+                                     cell_kwargs.get("align", "L"))
+            # An empty cell advances the cursor exactly like the filled one will
+            pdf.cell(w, h, "", **cell_kwargs)
+        
+        _draw_report(pdf, diagnosis, severity, rf_selected, record)
+        self.pdf = pdf
+    
+    def render(self, values: Dict[str, str]) -> bytes:
+        # Font definitions are never mutated while rendering; share them instead of copying
+        pdf = copy.deepcopy(self.pdf, {id(font): font for font in self.pdf.fonts.values()})
+        pdf.set_creation_date(datetime.now(timezone.utc))
+        # Fill in page order so fpdf keeps writing to the right content stream
+        for name, slot in sorted(self.slots.items(), key=lambda item: item[1].page):
+            pdf.page = slot.page
+            pdf.set_font(slot.family, slot.style, slot.size)
+            pdf.set_xy(slot.x, slot.y)
+            pdf.cell(slot.w, slot.h, values[name], align=slot.align)
+        pdf.page = len(pdf.pages)
+        return bytes(pdf.output())
+
+
+@lru_cache(maxsize=64)
+def _template(diagnosis: str, severity: int, rf_selected: bool) -> ReportTemplate:
+    return ReportTemplate(diagnosis, severity, rf_selected)
+
+
+def build_report(data: Dict) -> bytes:
+    """Generate a formatted medical report PDF with hospital branding."""
+    values = _report_values(data)
+    template = _template(
+        str(data.get("diagnosis", "Needs Review")),
+        _severity(data),
+        "Random Forest" in values["ml_model_used"],
+    )
+    return template.render(values)
+
+
+def report_cache_key(data: Dict) -> str:
+    """Hash of the rendered fields and template version; changes whenever the PDF would."""
+    fields = {field: data.get(field) for field in REPORT_FIELDS}
+    payload = json.dumps([TEMPLATE_VERSION, fields], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _report_path(data: Dict) -> Path:
+    report_id = re.sub(r"[^A-Za-z0-9_-]", "_", str(data.get("id") or "no-id"))
+    return REPORT_CACHE_DIR / report_id / f"{report_cache_key(data)}.pdf"
+
+
+def _scan_reports() -> List[Tuple[float, int, Path]]:
+    """(mtime, size, path) of every cached report."""
+    entries = []
+    for path in REPORT_CACHE_DIR.rglob("*.pdf"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+
+def _remove_empty_dir(path: Path):
+    if path != REPORT_CACHE_DIR:
+        try:
+            path.rmdir()
+        except OSError:
+            pass
+
+
+def _evict_reports():
+    """Delete least recently used reports until the cache is under the low watermark."""
+    global _cache_bytes
+    entries = _scan_reports()
+    total = sum(size for _, size, _ in entries)
+    target = REPORT_CACHE_MAX_MB * 1024 * 1024 * REPORT_CACHE_LOW_WATERMARK
+    for _, size, path in sorted(entries):
+        if total <= target:
+            break
+        path.unlink(missing_ok=True)
+        _remove_empty_dir(path.parent)
+        total -= size
+    _cache_bytes = total
+
+
+def read_cached_report(data: Dict, touch: bool = True) -> Optional[bytes]:
+    """
+    Cached PDF for an analysis, or None on a miss (nothing is rendered).
+    
+    With touch=False the hit leaves the file's mtime alone, so one-off
+    reads such as bulk exports do not reorder the LRU.
+    """
+    path = _report_path(data)
+    try:
+        pdf_bytes = path.read_bytes()
+        if touch:
+            os.utime(path)
+        return pdf_bytes
+    except FileNotFoundError:
+        return None
+
+
+def get_report(data: Dict) -> bytes:
+    """
+    PDF for an analysis, rendered once and then served from the disk cache.
+    
+    Entries are keyed by analysis id plus report_cache_key(), so edited
+    records or a new TEMPLATE_VERSION render afresh; older renders of the
+    same id (the other files in its directory) are dropped. A hit
+    refreshes the file's mtime, which is what LRU eviction orders by.
+    
+    A miss only touches the id's own directory. The cache size is a
+    running total, so the full directory scan for eviction runs only
+    once the limit is crossed (and each eviction frees down to the low
+    watermark). Other processes' writes are picked up at that scan.
+    """
+    path = _report_path(data)
+    pdf_bytes = read_cached_report(data)
+    if pdf_bytes is not None:
+        return pdf_bytes
+    
+    pdf_bytes = build_report(data)
+    global _cache_bytes
+    with _cache_lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(size for _, size, _ in _scan_reports())
+        path.parent.mkdir(parents=True, exist_ok=True)
+        for stale in path.parent.glob("*.pdf"):
+            try:
+                _cache_bytes -= stale.stat().st_size
+                stale.unlink()
+            except FileNotFoundError:
+                pass
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(pdf_bytes)
+        os.replace(tmp, path)
+        _cache_bytes += len(pdf_bytes)
+        if _cache_bytes > REPORT_CACHE_MAX_MB * 1024 * 1024:
+            _evict_reports()
+    return pdf_bytes
+
+
+def clear_report_cache():
+    """Remove every cached report."""
+    global _cache_bytes
+    with _cache_lock:
+        for _, _, path in _scan_reports():
+            path.unlink(missing_ok=True)
+            _remove_empty_dir(path.parent)
+        _cache_bytes = 0
+
+
+def _forget_job(key: str, job: Future):
+    with _report_jobs_lock:
+        if _report_jobs.get(key) is job:
+            del _report_jobs[key]
+
+
+def queue_report(data: Dict) -> Future:
+    """
+    Render and cache an analysis' report in the background.
+    
+    Jobs run on a pool of REPORT_WORKERS threads; queueing a report that
+    is already pending returns the existing job instead of a duplicate.
+    """
+    global _report_executor
+    key = str(_report_path(data))
+    with _report_jobs_lock:
+        job = _report_jobs.get(key)
+        if job is not None:
+            return job
+        if _report_executor is None:
+            _report_executor = ThreadPoolExecutor(max_workers=max(1, REPORT_WORKERS), thread_name_prefix="report")
+        job = _report_executor.submit(get_report, dict(data))
+        _report_jobs[key] = job
+    job.add_done_callback(lambda done: _forget_job(key, done))
+    return job
+
+
+def report_status(data: Dict) -> str:
+    """"ready" (cached on disk), "generating" (job pending) or "missing"."""
+    path = _report_path(data)
+    if path.exists():
+        return "ready"
+    with _report_jobs_lock:
+        return "generating" if str(path) in _report_jobs else "missing"
+
+
+def wait_for_report(data: Dict, timeout: float) -> Optional[bytes]:
+    """
+    Cached PDF, or wait up to timeout seconds for its background job
+    (queueing one if needed). None if it is still generating; a failed
+    render raises like build_report.
+    """
+    if report_status(data) == "ready":
+        return get_report(data)
+    try:
+        return queue_report(data).result(timeout=timeout)
+    except FutureTimeout:
+        return None
+
+
+# Columns of the handover summary table: (header, width mm, value)
+_HANDOVER_COLUMNS = [
+    ("#", 10, lambda n, row: str(n)),
+    ("Date", 32, lambda n, row: str(row.get("created_at", ""))[:16].replace("T", " ")),
+    ("Patient", 48, lambda n, row: str(row.get("user_email", "N/A"))),
+    ("Phone", 28, lambda n, row: str(row.get("phone", "N/A"))),
+    ("Age", 10, lambda n, row: str(row.get("age", "N/A"))),
+    ("Diagnosis", 0, lambda n, row: str(row.get("diagnosis", "Needs Review"))),
+]
+_HANDOVER_SUMMARY_COLUMNS = ["created_at", "user_email", "phone", "age", "diagnosis", "severity"]
+
+
+def _iter_shift(since: datetime, until: datetime, severity: int,
+                columns: Optional[List[str]] = None) -> Iterator[Dict]:
+    """Stored analyses of one severity created in [since, until), newest first."""
+    from lib.db import iter_analyses
+    
+    since_key, until_key = since.isoformat(), until.isoformat()
+    for row in iter_analyses(page_size=500, columns=columns):
+        created_at = str(row.get("created_at") or "")
+        if created_at < since_key:
+            # Keyset order is newest first; everything after this is older
+            return
+        if created_at >= until_key or _severity(row) != severity:
+            continue
+        yield row
+
+
+def _fit(pdf: FPDF, text: str, width: float) -> str:
+    """Truncate text to a table cell's width."""
+    if width <= 0 or pdf.get_string_width(text) <= width - 2:
+        return text
+    while text and pdf.get_string_width(text + "...") > width - 2:
+        text = text[:-1]
+    return text + "..."
+
+
+def _handover_table_header(pdf: FPDF):
+    pdf.set_font("Arial", "B", 9)
+    pdf.set_fill_color(230, 230, 230)
+    for header, width, _ in _HANDOVER_COLUMNS:
+        pdf.cell(width, 6, header, border=1, fill=True, ln=1 if width == 0 else 0)
+    pdf.set_font("Arial", size=8)
+
+
+def _handover_patient_page(pdf: FPDF, number: int, total: int, data: Dict):
+    """One compact page per urgent patient: identity, vitals, diagnosis and recommendation."""
+    values = _report_values(data)
+    severity = _severity(data)
+    pdf.add_page()
+    pdf.set_font("Arial", "B", 14)
+    pdf.cell(0, 9, f"Patient {number} of {total}", ln=1)
+    pdf.set_font("Arial", "B", 11)
+    pdf.cell(0, 7, f"Risk Level: {_SEVERITY_LABELS.get(severity, 'Unknown')} (Severity: {severity}/3)", ln=1)
+    pdf.set_font("Arial", size=10)
+    pdf.cell(0, 6, values["report_id"], ln=1)
+    pdf.cell(0, 6, f"Analysis Date: {str(data.get('created_at', 'N/A'))[:19].replace('T', ' ')}", ln=1)
+    pdf.set_line_width(0.3)
+    pdf.line(15, pdf.get_y() + 1, 195, pdf.get_y() + 1)
+    pdf.ln(4)
+    
+    fields = [
+        ("Email", "email"), ("Phone", "phone"), ("Age", "age"), ("Gender", "gender"),
+        ("Occupation", "occupation"), ("BMI Category", "bmi_category"),
+        ("Blood Pressure", "blood_pressure"), ("Heart Rate", "heart_rate"),
+        ("Sleep Duration", "sleep_duration"), ("Stress Level", "stress"),
+        ("Snoring Frequency", "snoring_frequency"), ("Working Hours", "working_hours"),
+        ("Best Model", "ml_model_used"), ("Prediction Confidence", "ml_confidence"),
+    ]
+    for label, name in fields:
+        pdf.cell(60, 6, f"{label}:", border=0)
+        pdf.cell(0, 6, values[name], ln=1, border=0)
+    
+    pdf.ln(3)
+    pdf.set_font("Arial", "B", 11)
+    pdf.cell(0, 7, "Primary Diagnosis:", ln=1)
+    pdf.set_font("Arial", size=10)
+    pdf.multi_cell(0, 6, str(data.get("diagnosis", "Needs Review")))
+    pdf.ln(2)
+    # Summary lines are short; one cell each avoids multi_cell's line breaking
+    for line in _SEVERITY_SUMMARIES.get(severity, "Unable to determine classification details").split("\n"):
+        pdf.cell(0, 5, line, ln=1)
+
+
+def _prune_handovers():
+    """Keep only the newest HANDOVER_KEEP handover documents."""
+    handovers = sorted(HANDOVER_DIR.glob("*.pdf"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for path in handovers[HANDOVER_KEEP:]:
+        path.unlink(missing_ok=True)
+
+
+def build_handover_report(since: Optional[datetime] = None, until: Optional[datetime] = None,
+                          min_severity: int = 2,
+                          progress: Optional[Callable[[int, int], None]] = None) -> Tuple[Path, int]:
+    """
+    One PDF listing every analysis with severity >= min_severity from the
+    last shift (HANDOVER_SHIFT_HOURS before `until`, default now): a cover
+    page with the summary table, then one page per patient, most severe
+    first and newest first within a severity.
+    
+    Analyses are never held in a list. Each severity is streamed from
+    lib.db in keyset pages: a narrow pass counts, another fills the summary
+    table and a full-row pass draws the patient pages, so memory grows only
+    with the compact page content fpdf keeps until output. The document is
+    written to .data/handovers; progress(done, total) is called per patient.
+    
+    Returns (pdf_path, patient_count).
+    """
+    until = until or datetime.now()
+    since = since or until - timedelta(hours=HANDOVER_SHIFT_HOURS)
+    severities = list(range(3, min_severity - 1, -1))
+    
+    counts = {
+        severity: sum(1 for _ in _iter_shift(since, until, severity, columns=["created_at", "severity"]))
+        for severity in severities
+    }
+    total = sum(counts.values())
+    
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    pdf.add_page()
     
-    # Return PDF bytes - properly convert bytearray to bytes
-    pdf_output = pdf.output(dest="S")
+    # Cover: hospital header and shift summary
+    pdf.set_font("Arial", "B", 18)
+    pdf.cell(0, 10, "MediSleep Hospital", ln=1, align="C")
+    pdf.set_font("Arial", size=11)
+    pdf.cell(0, 6, "Sleep Disorder Analysis & Classification Center", ln=1, align="C")
+    pdf.ln(4)
+    pdf.set_font("Arial", "B", 16)
+    pdf.cell(0, 10, "Shift Handover - Urgent Cases", ln=1)
+    pdf.set_font("Arial", size=10)
+    pdf.cell(0, 6, f"Shift: {since.strftime('%Y-%m-%d %H:%M')} - {until.strftime('%Y-%m-%d %H:%M')}", ln=1)
+    pdf.cell(0, 6, f"Generated: {datetime.utcnow().strftime('%Y-%m-%d %H:%M UTC')}", ln=1)
+    for severity in severities:
+        pdf.cell(0, 6, f"{_SEVERITY_LABELS.get(severity, severity)}: {counts[severity]} patient(s)", ln=1)
+    pdf.ln(2)
+    # The disclaimer applies to every page; print it once instead of per patient
+    pdf.set_font("Arial", "I", 8)
+    pdf.set_fill_color(240, 240, 240)
+    pdf.multi_cell(0, 4, _DISCLAIMER, fill=True)
+    pdf.ln(4)
     
-    # Handle both string and bytearray return types
-    if isinstance(pdf_output, str):
-        return pdf_output.encode("latin1")
-    elif isinstance(pdf_output, bytearray):
-        return bytes(pdf_output)
+    # Summary table, redrawing the header row on every new page
+    if total:
+        _handover_table_header(pdf)
     else:
-        return pdf_output
+        pdf.cell(0, 8, "No urgent cases in this shift.", ln=1)
+    number = 0
+    for severity in severities:
+        for row in _iter_shift(since, until, severity, columns=_HANDOVER_SUMMARY_COLUMNS):
+            number += 1
+            if pdf.get_y() + 5 > pdf.page_break_trigger:
+                pdf.add_page()
+                _handover_table_header(pdf)
+            pdf.set_font("Arial", "B" if severity >= 3 else "", 8)
+            for _, width, value in _HANDOVER_COLUMNS:
+                text = value(number, row)
+                pdf.cell(width, 5, _fit(pdf, text, width or pdf.w - pdf.r_margin - pdf.get_x()),
+                         border=1, ln=1 if width == 0 else 0)
+    
+    # Per-patient pages, in the same order as the table
+    done = 0
+    if progress:
+        progress(done, total)
+    for severity in severities:
+        for row in _iter_shift(since, until, severity):
+            done += 1
+            _handover_patient_page(pdf, done, total, row)
+            if progress:
+                progress(done, total)
+    
+    HANDOVER_DIR.mkdir(parents=True, exist_ok=True)
+    path = HANDOVER_DIR / f"handover_{until.strftime('%Y%m%d-%H%M%S')}.pdf"
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    pdf.output(str(tmp))
+    os.replace(tmp, path)
+    _prune_handovers()
+    return path, done
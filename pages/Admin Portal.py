@@ -9,7 +9,10 @@ if str(_repo_root) not in sys.path:
 
 import streamlit as st
 import pandas as pd
-from lib.db import list_all_analyses
+from lib.db import page_all_analyses, supabase_status, get_stats
+from lib.ml import start_retrain_from_analyses, retrain_status
+from lib.pdf import build_handover_report, HANDOVER_SHIFT_HOURS
+from datetime import datetime, timedelta
 
 st.set_page_config(page_title="Admin Portal", page_icon="🛠", layout="wide")
 
@@ -23,6 +26,38 @@ with st.sidebar:
     else:
         st.success("✅ Service Online")
     
+    db_status = supabase_status()
+    if not db_status["configured"]:
+        st.caption("💾 Database: local storage")
+    elif db_status["state"] == "closed":
+        st.caption("☁️ Database: Supabase")
+    else:
+        st.warning(f"⚠️ Supabase unreachable - using local storage (next retry in {db_status['retry_in']:.0f}s)")
+    if db_status["outbox_error"]:
+        st.warning(f"⚠️ Supabase refused queued analyses (they are kept locally): {db_status['outbox_error']}")
+    if db_status["missing_columns"]:
+        st.warning(
+            "⚠️ Supabase table lacks columns " + ", ".join(db_status["missing_columns"])
+            + "; they are not stored remotely (see README for the ALTER TABLE)"
+        )
+    
+    # Retrain on stored analyses in the background; models swap only if accuracy holds
+    if st.session_state.get("is_admin"):
+        retrain = retrain_status()
+        if retrain["running"]:
+            st.caption("🧠 Retraining models from stored analyses...")
+        elif st.button("🧠 Retrain Models", use_container_width=True):
+            start_retrain_from_analyses()
+            st.rerun()
+        last = retrain["last"]
+        if last and not retrain["running"]:
+            if last.get("error"):
+                st.caption(f"⚠️ Last retrain failed: {last['error']}")
+            elif last.get("swapped"):
+                st.caption(f"✅ Models updated ({last['n_stored']} analyses, accuracy {last['new_accuracy'] * 100:.1f}%)")
+            else:
+                st.caption(f"ℹ️ Models kept: {last.get('reason')}")
+    
     st.divider()
     if st.button("🏠 Home", use_container_width=True):
         st.session_state["is_admin"] = False
@@ -47,9 +82,17 @@ if st.button("Logout", key="admin_logout"):
 
 st.divider()
 
-# Fetch all analyses
-rows = list_all_analyses(limit=200)
+# Fetch one page of analyses (newest first); each entry is the cursor that starts a page
+page_cursors = st.session_state.setdefault("admin_page_cursors", [None])
+rows, next_cursor = page_all_analyses(
+    limit=200,
+    cursor=page_cursors[-1],
+    columns=["created_at", "user_email", "phone", "age", "diagnosis", "severity", "id"],
+)
 if not rows:
+    if len(page_cursors) > 1:
+        st.session_state["admin_page_cursors"] = [None]
+        st.rerun()
     st.info("📋 No patient analyses yet.")
     st.stop()
 
@@ -59,6 +102,19 @@ df["URGENCY"] = df["severity"].apply(
     lambda s: "🔴 URGENT" if int(s) >= 3 else "🟡 MODERATE" if int(s) == 2 else "🟢 NORMAL"
 )
 
+# Summary tiles from the running counters
+stats = get_stats()
+by_severity = stats["by_severity"]
+col1, col2, col3, col4 = st.columns(4)
+with col1:
+    st.metric("Total Reports", stats["total"])
+with col2:
+    st.metric("🔴 Urgent", by_severity.get("3", 0))
+with col3:
+    st.metric("🟡 Moderate", by_severity.get("2", 0))
+with col4:
+    st.metric("🟢 Normal", by_severity.get("0", 0) + by_severity.get("1", 0))
+
 # Display main table
 st.subheader("All Sleep Disorder Reports")
 display_cols = ["created_at", "user_email", "phone", "age", "diagnosis", "severity", "URGENCY", "id"]
@@ -68,6 +124,19 @@ st.dataframe(
     hide_index=True
 )
 
+# Pagination
+col_newer, col_page, col_older = st.columns([1, 2, 1])
+with col_newer:
+    if st.button("⬅️ Newer", disabled=len(page_cursors) == 1, use_container_width=True):
+        page_cursors.pop()
+        st.rerun()
+with col_page:
+    st.caption(f"Page {len(page_cursors)} · {len(rows)} reports")
+with col_older:
+    if st.button("Older ➡️", disabled=next_cursor is None, use_container_width=True):
+        page_cursors.append(next_cursor)
+        st.rerun()
+
 st.divider()
 
 # Quick Actions
@@ -93,5 +162,39 @@ with col2:
         else:
             st.warning("Please enter a phone number")
 
+st.divider()
+
+# Shift handover: every moderate/urgent case of the last shift in one PDF
+st.subheader("🚨 Shift Handover")
+st.write("One PDF with a summary table and a page per patient for every case with severity 2 or higher.")
+shift_hours = st.number_input("Shift length (hours)", min_value=1, max_value=72,
+                              value=int(HANDOVER_SHIFT_HOURS), step=1)
+if st.button("🚨 Build Handover PDF", use_container_width=True):
+    progress_bar = st.progress(0.0, text="Collecting urgent cases...")
+    
+    def _handover_progress(done, total):
+        progress_bar.progress(done / total if total else 1.0, text=f"Added {done} of {total} patients")
+    
+    try:
+        until = datetime.now()
+        handover_path, count = build_handover_report(since=until - timedelta(hours=shift_hours), until=until,
+                                                     progress=_handover_progress)
+        st.session_state["handover_pdf"] = str(handover_path)
+        st.session_state["handover_count"] = count
+    except Exception as e:
+        st.error(f"❌ Error building handover: {str(e)}")
+
+handover_pdf = Path(st.session_state.get("handover_pdf", ""))
+if st.session_state.get("handover_pdf") and handover_pdf.is_file():
+    st.success(f"✅ {st.session_state.get('handover_count', 0)} patients in handover")
+    with open(handover_pdf, "rb") as f:
+        st.download_button(
+            label="⬇️ Download Handover PDF",
+            data=f,
+            file_name=handover_pdf.name,
+            mime="application/pdf",
+            use_container_width=True
+        )
+
 st.divider()
 st.caption("📊 Hospital Action Panel - Use filters above to search for specific patients.")
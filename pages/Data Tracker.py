@@ -1,8 +1,19 @@
+import sys
+from pathlib import Path
+
+# Add repo root to sys.path
+_file = Path(__file__).resolve()
+_repo_root = _file.parent.parent  # Go up from pages/ to repo root
+if str(_repo_root) not in sys.path:
+    sys.path.insert(0, str(_repo_root))
+
 import streamlit as st
 import json
-from pathlib import Path
 import pandas as pd
 from datetime import datetime
+from lib.db import SEGMENTS_DIR, SQLITE_FILE, LOCAL_BACKEND, read_local_analyses, clear_local_analyses, get_stats
+from lib.auth import USERS_FILE, list_users, clear_users
+from lib.export import export_reports_zip
 
 st.set_page_config(page_title="Data Tracker", page_icon="📊", layout="wide")
 
@@ -35,7 +46,8 @@ with col1:
     **Local Development:**
     - Path: `.data/` folder
     - Users: `.data/users.json`
-    - Analyses: `.data/analyses.json`
+    - Analyses: `.data/analyses/` (one `YYYY-MM.jsonl` per month)
+    - SQLite backend (`LOCAL_STORAGE_BACKEND=sqlite`): `.data/sleep.db`
     
     **Files auto-created** when you register users and submit analyses
     """)
@@ -50,6 +62,7 @@ with col2:
     - Format: JSON
     
     **Analyses File:**
+    - Format: JSON Lines (one record per line, append-only), closed months gzipped
     - Sleep disorder predictions
     - Patient health metrics
     - Diagnosis results
@@ -63,14 +76,10 @@ tab1, tab2, tab3, tab4 = st.tabs(["👥 Registrations", "📋 Analyses", "📄 R
 with tab1:
     st.subheader("Registered Users")
     
-    data_dir = Path(__file__).parent.parent / ".data"
-    users_file = data_dir / "users.json"
+    users_file = SQLITE_FILE if LOCAL_BACKEND == "sqlite" else USERS_FILE
     
     if users_file.exists():
-        with open(users_file, "r") as f:
-            users_data = json.load(f)
-        
-        users = users_data.get("users", {})
+        users = list_users()
         
         if users:
             col1, col2, col3 = st.columns(3)
@@ -96,26 +105,25 @@ with tab1:
 with tab2:
     st.subheader("Sleep Disorder Analyses")
     
-    analyses_file = data_dir / "analyses.json"
+    analyses_file = SQLITE_FILE if LOCAL_BACKEND == "sqlite" else SEGMENTS_DIR
+    
+    # Counter tiles come from the running stats and render before the full history is read
+    stats = get_stats()
+    if stats["total"]:
+        by_diagnosis = stats["by_diagnosis"]
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Total Analyses", stats["total"])
+        with col2:
+            st.metric("Normal Cases", by_diagnosis.get("Normal", 0))
+        with col3:
+            risk_count = sum(n for d, n in by_diagnosis.items() if "Risk" in d)
+            st.metric("Risk Cases", risk_count)
     
     if analyses_file.exists():
-        with open(analyses_file, "r") as f:
-            analyses_data = json.load(f)
-        
-        analyses = analyses_data.get("analyses", [])
+        analyses = read_local_analyses() if stats["total"] else []
         
         if analyses:
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("Total Analyses", len(analyses))
-            with col2:
-                diagnoses = [a.get("diagnosis") for a in analyses]
-                normal_count = diagnoses.count("Normal")
-                st.metric("Normal Cases", normal_count)
-            with col3:
-                risk_count = len([d for d in diagnoses if "Risk" in str(d)])
-                st.metric("Risk Cases", risk_count)
-            
             st.subheader("Analysis Details")
             
             # Create display dataframe
@@ -174,10 +182,7 @@ with tab3:
     st.subheader("Generated Reports")
     
     if analyses_file.exists():
-        with open(analyses_file, "r") as f:
-            analyses_data = json.load(f)
-        
-        analyses = analyses_data.get("analyses", [])
+        analyses = read_local_analyses()
         
         if analyses:
             st.info("Each analysis automatically generates a reportable record with the following data:")
@@ -209,6 +214,45 @@ with tab3:
                 st.info("To download as PDF: Go to Sleep Analysis Dashboard → View Report")
         else:
             st.info("No reports yet. Submit analyses first.")
+    
+    st.subheader("📦 Bulk Export")
+    st.write("Download every report in a date range as one ZIP of PDFs.")
+    today = datetime.now().date()
+    col1, col2 = st.columns(2)
+    with col1:
+        export_range = st.date_input("Date range", value=(today.replace(day=1), today), max_value=today)
+    with col2:
+        export_severities = st.multiselect("Severity", [0, 1, 2, 3], default=[0, 1, 2, 3],
+            format_func=lambda s: {0: "0 - Normal", 1: "1 - Low", 2: "2 - Moderate", 3: "3 - High"}[s])
+    
+    if st.button("📦 Export Reports", use_container_width=True):
+        if not isinstance(export_range, (list, tuple)) or len(export_range) != 2:
+            st.error("❌ Select a start and end date")
+        else:
+            progress_bar = st.progress(0.0, text="Preparing export...")
+            
+            def _export_progress(done, total):
+                progress_bar.progress(done / total if total else 1.0, text=f"Rendered {done} of {total} reports")
+            
+            try:
+                zip_path, count = export_reports_zip(export_range[0], export_range[1], export_severities,
+                                                     progress=_export_progress)
+                st.session_state["export_zip"] = str(zip_path)
+                st.session_state["export_count"] = count
+            except Exception as e:
+                st.error(f"❌ Error exporting reports: {str(e)}")
+    
+    export_zip = Path(st.session_state.get("export_zip", ""))
+    if st.session_state.get("export_zip") and export_zip.is_file():
+        st.success(f"✅ {st.session_state.get('export_count', 0)} reports exported")
+        with open(export_zip, "rb") as f:
+            st.download_button(
+                label="⬇️ Download ZIP",
+                data=f,
+                file_name=export_zip.name,
+                mime="application/zip",
+                use_container_width=True
+            )
 
 with tab4:
     st.subheader("Raw Data View")
@@ -220,18 +264,14 @@ with tab4:
     with col1:
         if st.button("📖 Show Users (JSON)"):
             if users_file.exists():
-                with open(users_file, "r") as f:
-                    users_data = json.load(f)
-                st.json(users_data)
+                st.json({"users": list_users()})
             else:
                 st.warning("No users file found")
     
     with col2:
         if st.button("📖 Show Analyses (JSON)"):
             if analyses_file.exists():
-                with open(analyses_file, "r") as f:
-                    analyses_data = json.load(f)
-                st.json(analyses_data)
+                st.json({"analyses": read_local_analyses()})
             else:
                 st.warning("No analyses file found")
 
@@ -246,10 +286,8 @@ with col1:
     if st.button("🗑️ Clear All Test Data", help="Delete all local data files"):
         if st.session_state.get("confirm_delete", False):
             try:
-                if users_file.exists():
-                    users_file.unlink()
-                if analyses_file.exists():
-                    analyses_file.unlink()
+                clear_users()
+                clear_local_analyses()
                 st.success("✅ All data cleared!")
                 st.session_state["confirm_delete"] = False
             except Exception as e:
@@ -263,11 +301,9 @@ with col2:
         if users_file.exists() or analyses_file.exists():
             export_data = {}
             if users_file.exists():
-                with open(users_file, "r") as f:
-                    export_data["users"] = json.load(f)
+                export_data["users"] = {"users": list_users()}
             if analyses_file.exists():
-                with open(analyses_file, "r") as f:
-                    export_data["analyses"] = json.load(f)
+                export_data["analyses"] = {"analyses": read_local_analyses()}
             
             st.download_button(
                 label="Download Data (JSON)",
@@ -9,7 +9,7 @@ if str(_repo_root) not in sys.path:
 
 import streamlit as st
 from lib.db import get_analysis_by_id
-from lib.pdf import build_report
+from lib.pdf import get_report, report_status, wait_for_report
 
 st.set_page_config(page_title="Report View", page_icon="🧾", layout="centered")
 
@@ -214,14 +214,25 @@ st.divider()
 # PDF Download Section
 st.subheader("📥 Download Report")
 try:
-    pdf_bytes = build_report(row)
-    st.download_button(
-        label="📄 Download as PDF",
-        data=pdf_bytes,
-        file_name=f"sleep_report_{analysis_id}.pdf",
-        mime="application/pdf",
-        use_container_width=True
-    )
+    # Pre-generated in the background when the analysis was saved; reruns read the cached file
+    if report_status(row) == "ready":
+        pdf_bytes = get_report(row)
+    else:
+        with st.spinner("⏳ Generating your PDF report..."):
+            pdf_bytes = wait_for_report(row, timeout=5)
+    
+    if pdf_bytes is None:
+        st.info("⏳ Your PDF report is still being generated.")
+        if st.button("🔄 Refresh", use_container_width=True):
+            st.rerun()
+    else:
+        st.download_button(
+            label="📄 Download as PDF",
+            data=pdf_bytes,
+            file_name=f"sleep_report_{analysis_id}.pdf",
+            mime="application/pdf",
+            use_container_width=True
+        )
 except Exception as e:
     st.error(f"❌ Error generating PDF: {str(e)}")
 
@@ -9,11 +9,15 @@ if str(_repo_root) not in sys.path:
 
 import streamlit as st
 import pandas as pd
-from lib.ml import classify
-from lib.db import save_analysis, list_user_analyses
+from lib.ml import classify, start_warmup
+from lib.db import save_analysis, page_user_analyses
+from lib.pdf import queue_report
 
 st.set_page_config(page_title="Sleep Analysis Dashboard", page_icon="📊", layout="wide")
 
+# No-op if the home page already started it; covers users landing here directly
+start_warmup()
+
 # Sidebar - Service Status
 with st.sidebar:
     st.write("## 🏥 Service Status")
@@ -129,6 +133,10 @@ with tab1:
                 "bmi_category": bmi_category,
                 "snoring_frequency": int(snoring_frequency),
                 "working_hours": int(working_hours),
+                "sleep_quality": int(sleep_quality),
+                "caffeine_intake": int(caffeine_intake),
+                "exercise_frequency": int(exercise_frequency),
+                "body_temperature": float(body_temperature),
                 "diagnosis": diagnosis,
                 "severity": int(severity),
                 "ml_model_used": ml_details.get("best_model_name"),
@@ -140,6 +148,8 @@ with tab1:
             # Save to database
             try:
                 saved = save_analysis(row)
+                # Render the PDF in the background so Report View can serve it instantly
+                queue_report(saved)
                 st.success("✅ Prediction saved successfully!")
                 
                 # Display diagnosis result
@@ -164,10 +174,16 @@ with tab1:
 with tab2:
     st.subheader("📋 Your Analysis History")
     
-    rows = list_user_analyses(user, limit=50)
+    # Keyset pagination: each entry is the cursor that starts a page
+    history_cursors = st.session_state.setdefault("history_page_cursors", [None])
+    history_cols = ["created_at", "age", "diagnosis", "phone", "severity", "id"]
+    rows, next_cursor = page_user_analyses(user, limit=50, cursor=history_cursors[-1], columns=history_cols)
+    if not rows and len(history_cursors) > 1:
+        st.session_state["history_page_cursors"] = [None]
+        st.rerun()
     if rows:
         df = pd.DataFrame(rows)
-        df = df[["created_at", "age", "diagnosis", "phone", "severity", "id"]].sort_values("created_at", ascending=False)
+        df = df[history_cols].sort_values("created_at", ascending=False)
         
         # Display dataframe with styling
         st.dataframe(
@@ -176,6 +192,18 @@ with tab2:
             hide_index=True
         )
         
+        col_newer, col_page, col_older = st.columns([1, 2, 1])
+        with col_newer:
+            if st.button("⬅️ Newer", disabled=len(history_cursors) == 1, use_container_width=True):
+                history_cursors.pop()
+                st.rerun()
+        with col_page:
+            st.caption(f"Page {len(history_cursors)}")
+        with col_older:
+            if st.button("Older ➡️", disabled=next_cursor is None, use_container_width=True):
+                history_cursors.append(next_cursor)
+                st.rerun()
+        
         # Option to view any report
         st.subheader("View Any Report")
         report_id = st.text_input("Enter Report ID:", placeholder="Select from table above")
@@ -8,6 +8,8 @@ if str(_repo_root) not in sys.path:
     sys.path.insert(0, str(_repo_root))
 
 import streamlit as st
+from lib.ml import start_warmup, model_status
+from lib.inference import start_pool
 
 st.set_page_config(
     page_title="Sleep Disorder Analysis MVP",
@@ -16,6 +18,11 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Load (or train) ML models in the background so the first prediction is fast,
+# and start the inference worker pool when INFERENCE_WORKERS is set
+start_warmup()
+start_pool()
+
 if "user_email" not in st.session_state:
     st.session_state["user_email"] = None
 if "is_admin" not in st.session_state:
@@ -34,6 +41,14 @@ with st.sidebar:
     else:
         st.success("✅ Service Online")
     
+    ml_status = model_status()
+    if ml_status["ready"]:
+        st.caption(f"🧠 ML models ready (v{ml_status.get('version', '?')})")
+    elif ml_status["error"]:
+        st.caption(f"⚠️ ML models failed to load: {ml_status['error']}")
+    else:
+        st.caption("⏳ ML models warming up...")
+    
     st.divider()
     
     if st.session_state.get("user_email"):